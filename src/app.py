@@ -2,10 +2,16 @@ import json
 import logging
 import os
 import time as time_mod
+import uuid
 from collections import OrderedDict
-from flask import Flask, request, Response, render_template, jsonify
+from contextlib import contextmanager
+from itertools import zip_longest
+from flask import Flask, request, Response, render_template, jsonify, g, has_request_context
+from xml.etree import ElementTree
 from xml.sax.saxutils import escape
 import requests.exceptions
+import services.history
+import services.hotset
 import services.monkeytype
 
 logging.basicConfig(
@@ -32,6 +38,7 @@ THEMES = {t["name"]: t for t in THEMES_LIST}
 
 ALLOWED_TIME_VALUES = {"15", "30", "60", "120"}
 ALLOWED_WORD_VALUES = {"10", "25", "50", "100"}
+ALLOWED_VARIANTS = {"card", "trend"}
 
 RATE_LIMIT_WINDOW = 60  # seconds
 RATE_LIMIT_MAX = 30  # max SVG requests per IP per window
@@ -67,6 +74,81 @@ def _is_rate_limited(ip: str) -> bool:
     return False
 
 
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "1000"))
+_span_hooks = []
+
+
+def register_span_hook(hook):
+    """Register a callable that receives one dict per timed phase, e.g. to
+    forward spans to a tracing collector. Hooks must not raise."""
+    _span_hooks.append(hook)
+    return hook
+
+
+@contextmanager
+def _timed(phase: str):
+    """Time a phase of the current request for Server-Timing and tracing.
+    Does nothing outside a request, e.g. in the background warmer."""
+    if not has_request_context():
+        yield
+        return
+    wall_start = time_mod.time()
+    start = time_mod.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time_mod.perf_counter() - start) * 1000
+        g.setdefault("phase_timings", []).append((phase, wall_start, duration_ms))
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time_mod.perf_counter()
+    g.request_id = uuid.uuid4().hex
+
+
+# Budget waits and upstream fetches happen inside the service; time them as our phases
+services.monkeytype.set_phase_timer(_timed)
+
+
+@app.after_request
+def _report_phase_timings(resp: Response) -> Response:
+    timings = g.get("phase_timings")
+    if not timings:
+        return resp
+
+    resp.headers["Server-Timing"] = ", ".join(
+        f"{phase};dur={duration_ms:.1f}" for phase, _, duration_ms in timings
+    )
+
+    total_ms = (time_mod.perf_counter() - g.request_start) * 1000
+    if total_ms >= SLOW_REQUEST_MS:
+        logging.warning("slow request %s", json.dumps({
+            "request_id": g.request_id,
+            "path": request.path,
+            "username": request.args.get("username"),
+            "status": resp.status_code,
+            "total_ms": round(total_ms, 1),
+            "phases": {phase: round(duration_ms, 1) for phase, _, duration_ms in timings},
+        }))
+
+    for hook in _span_hooks:
+        for phase, wall_start, duration_ms in timings:
+            try:
+                hook({
+                    "request_id": g.request_id,
+                    "name": phase,
+                    "start": wall_start,
+                    "duration_ms": duration_ms,
+                    "path": request.path,
+                    "username": request.args.get("username"),
+                    "status": resp.status_code,
+                })
+            except Exception:
+                logging.exception("Span hook %r failed", hook)
+    return resp
+
+
 def theme_to_card_colors(t):
     """Map a monkeytype theme to SVG card colors."""
     return {
@@ -95,12 +177,118 @@ def render_error_svg(message: str, theme: dict) -> str:
 </svg>'''
 
 
-def _svg_response(svg: str, status: int = 200) -> Response:
+SVG_NS = "http://www.w3.org/2000/svg"
+ElementTree.register_namespace("", SVG_NS)
+
+# Elements whose repeated presentation attributes get folded into classes in
+# compact output, and the attributes that need a unit once they're CSS
+COMPACT_CLASS_TAGS = {"text", "line"}
+COMPACT_GEOMETRY_ATTRS = {"x", "y", "x1", "y1", "x2", "y2"}
+COMPACT_PX_ATTRS = {"font-size", "letter-spacing", "stroke-width"}
+
+
+def _class_name(i: int) -> str:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return letters[i] if i < len(letters) else f"c{i}"
+
+
+def minify_svg(svg: str) -> str:
+    """Return a smaller SVG that renders the same: comments and indentation
+    are dropped, shared text/line attributes move into a single <style> block
+    as classes, and the logo uses its precomputed minimal paths."""
+    root = ElementTree.fromstring(svg)  # the default parser already drops comments
+    minimal_paths = dict(zip(LOGO_PATHS, LOGO_PATHS_MIN))
+    styled = []
+
+    for el in root.iter():
+        if el.text is not None and not el.text.strip():
+            el.text = None
+        if el.tail is not None and not el.tail.strip():
+            el.tail = None
+
+        tag = el.tag.rsplit("}", 1)[-1]
+        if tag == "path" and el.get("d") in minimal_paths:
+            el.set("d", minimal_paths[el.get("d")])
+        elif tag in COMPACT_CLASS_TAGS:
+            props = {
+                name: value for name, value in el.attrib.items()
+                if name not in COMPACT_GEOMETRY_ATTRS
+            }
+            for name in props:
+                del el.attrib[name]
+            styled.append((el, tag, props))
+
+    # Attributes every element of a tag agrees on become one rule for the tag,
+    # the rest are grouped into a class per distinct combination
+    shared = {}
+    for _, tag, props in styled:
+        if tag not in shared:
+            shared[tag] = dict(props)
+        else:
+            shared[tag] = {k: v for k, v in shared[tag].items() if props.get(k) == v}
+    classes = {}
+    for el, tag, props in styled:
+        own = tuple((k, v) for k, v in props.items() if k not in shared[tag])
+        if own:
+            el.set("class", classes.setdefault(own, _class_name(len(classes))))
+
+    def css(props):
+        return ";".join(
+            f"{name}:{value}px" if name in COMPACT_PX_ATTRS else f"{name}:{value}"
+            for name, value in props
+        )
+
+    rules = [f"{tag}{{{css(props.items())}}}" for tag, props in shared.items() if props]
+    rules += [f".{cls}{{{css(props)}}}" for props, cls in classes.items()]
+
+    style = root.find(f".//{{{SVG_NS}}}style")
+    if style is None:
+        style = ElementTree.Element(f"{{{SVG_NS}}}style")
+        root.insert(0, style)
+    # @import has to stay ahead of any rules
+    style.text = " ".join((style.text or "").split()) + "".join(rules)
+
+    return ElementTree.tostring(root, encoding="unicode").replace(" />", "/>")
+
+
+def _svg_response(svg: str, status: int = 200, max_age: int = 300) -> Response:
+    """Wrap an SVG in a response, minifying it if the request asked for compact=1."""
+    if request.args.get("compact") in ("1", "true"):
+        with _timed("minify"):
+            svg = minify_svg(svg)
     resp = Response(svg, status=status, mimetype="image/svg+xml")
-    resp.headers["Cache-Control"] = "public, max-age=300"
+    resp.headers["Cache-Control"] = f"public, max-age={max_age}"
     return resp
 
 
+def _load_profile(username: str):
+    """Fetch a profile for a request, mapping failures to a user-facing message.
+    Returns (profile, None, 200) on success, else (None, message, status)."""
+    with _timed("cache"):
+        user_profile = services.monkeytype.get_cached_profile(username)
+    if user_profile is not None:
+        return user_profile, None, 200
+
+    try:
+        return services.monkeytype.get_profile(username), None, 200
+    except requests.exceptions.HTTPError as e:
+        status = e.response.status_code if e.response is not None else 502
+        if status == 404:
+            logging.warning("User not found: %s", username)
+            return None, f'could not find user "{username}"', 404
+        logging.error("Monkeytype API error for %s: %s", username, e)
+        return None, "monkeytype API error — try again later", 502
+    except services.monkeytype.UpstreamBudgetExceeded as e:
+        logging.warning("Upstream budget exceeded for %s: %s", username, e)
+        return None, "monkeytype is busy — try again later", 503
+    except requests.exceptions.RequestException as e:
+        logging.error("Network error fetching %s: %s", username, e)
+        return None, "could not reach monkeytype — try again later", 502
+    except Exception:
+        logging.exception("Unexpected error fetching profile for %s", username)
+        return None, "something went wrong — try again later", 500
+
+
 @app.get("/")
 @app.get("/builder")
 def builder():
@@ -118,18 +306,92 @@ def api_themes():
             "subColor": t.get("subColor", "#666"),
             "textColor": t["textColor"],
             "subAltColor": t.get("subAltColor", t["bgColor"]),
+            "caretColor": t.get("caretColor", t["mainColor"]),
         }
         for t in THEMES_LIST
     ]
     return jsonify(compact)
 
 
+@app.get("/api/card-template")
+def api_card_template():
+    """Return the card SVG with {{placeholders}} in place of colors and stats,
+    so the builder can preview theme and mode changes without a server render."""
+    fields = ("page_bg", "card_bg", "border", "fg", "muted", "accent", "accent2")
+    svg = render_monkeytype_card(
+        username="{{username}}",
+        time_typing="{{time_typing}}",
+        left_stat="{{left_stat}}",
+        right_stat="{{right_stat}}",
+        left_acc="{{left_acc}}",
+        right_acc="{{right_acc}}",
+        secondCount="{{secondCount}}",
+        wordCount="{{wordCount}}",
+        theme={k: "{{%s}}" % k for k in fields},
+    )
+    resp = Response(svg, mimetype="image/svg+xml")
+    resp.headers["Cache-Control"] = "public, max-age=3600"
+    return resp
+
+
+@app.get("/api/stats")
+def api_stats():
+    """Return a user's card stats for every time and word mode as JSON."""
+    username = request.args.get("username", "").strip()
+
+    client_ip = request.remote_addr or "unknown"
+    with _timed("ratelimit"):
+        limited = _is_rate_limited(client_ip)
+    if limited:
+        return jsonify(error="rate limited — try again in a minute"), 429
+
+    if not username or not services.monkeytype.is_valid_username(username):
+        return jsonify(error="invalid username"), 400
+
+    user_profile, error, status = _load_profile(username)
+    if error:
+        return jsonify(error=error), status
+
+    if services.monkeytype.is_profile_private(user_profile):
+        return jsonify(error=f'"{username}" has a private profile')
+
+    with _timed("stats"):
+        time_values = sorted(ALLOWED_TIME_VALUES, key=int)
+        word_values = sorted(ALLOWED_WORD_VALUES, key=int)
+        time_stats = {}
+        word_stats = {}
+        time_typing = None
+        # One lookup per (time, words) pair; the shorter list runs out first
+        for time_value, word_value in zip_longest(time_values, word_values):
+            stats = services.monkeytype.get_card_stats_from_profile(
+                user_profile, int(time_value or time_values[0]), int(word_value or word_values[0])
+            )
+            if time_typing is None:
+                time_typing = stats["time_typing"]
+            if time_value is not None:
+                time_stats[time_value] = {"wpm": stats["time_wpm"], "acc": stats["time_acc"]}
+            if word_value is not None:
+                word_stats[word_value] = {"wpm": stats["words_wpm"], "acc": stats["words_acc"]}
+
+    resp = jsonify(
+        username=username,
+        time_typing=time_typing,
+        time=time_stats,
+        words=word_stats,
+    )
+    resp.headers["Cache-Control"] = (
+        f"public, max-age={services.monkeytype.get_cache_max_age(username)}"
+    )
+    return resp
+
+
 @app.get("/monkeytype.svg")
 def monkeytype_svg():
     username = request.args.get("username", "guest").strip()
     theme_name = request.args.get("theme", "serika_dark").strip()
     wordValue = request.args.get("wordValue", "10").strip()
     timeValue = request.args.get("timeValue", "15").strip()
+    variant = request.args.get("variant", "card").strip()
 
     # Resolve theme first so error SVGs can use it
     if theme_name not in THEMES:
@@ -137,7 +399,9 @@ def monkeytype_svg():
     theme = theme_to_card_colors(THEMES[theme_name])
 
     client_ip = request.remote_addr or "unknown"
-    if _is_rate_limited(client_ip):
+    with _timed("ratelimit"):
+        limited = _is_rate_limited(client_ip)
+    if limited:
         return _svg_response(
             render_error_svg("rate limited — try again in a minute", theme), 429
         )
@@ -161,52 +425,90 @@ def monkeytype_svg():
             ),
             400,
         )
-
-    try:
-        user_profile = services.monkeytype.get_profile(username)
-    except requests.exceptions.HTTPError as e:
-        status = e.response.status_code if e.response is not None else 502
-        if status == 404:
-            logging.warning("User not found: %s", username)
-            return _svg_response(
-                render_error_svg(f'could not find user "{username}"', theme), 404
-            )
-        logging.error("Monkeytype API error for %s: %s", username, e)
-        return _svg_response(
-            render_error_svg("monkeytype API error — try again later", theme), 502
-        )
-    except requests.exceptions.RequestException as e:
-        logging.error("Network error fetching %s: %s", username, e)
+    if variant not in ALLOWED_VARIANTS:
         return _svg_response(
-            render_error_svg("could not reach monkeytype — try again later", theme), 502
-        )
-    except Exception:
-        logging.exception("Unexpected error fetching profile for %s", username)
-        return _svg_response(
-            render_error_svg("something went wrong — try again later", theme), 500
+            render_error_svg(
+                f"invalid variant (use {', '.join(sorted(ALLOWED_VARIANTS))})",
+                theme,
+            ),
+            400,
         )
 
+    user_profile, error, status = _load_profile(username)
+    if error:
+        return _svg_response(render_error_svg(error, theme), status)
+    services.hotset.record_hit(username)
+
     if services.monkeytype.is_profile_private(user_profile):
         return _svg_response(
             render_error_svg(f'"{username}" has a private profile', theme)
         )
 
-    stats = services.monkeytype.get_card_stats_from_profile(
-        user_profile, int(timeValue), int(wordValue)
-    )
+    with _timed("stats"):
+        stats = services.monkeytype.get_card_stats_from_profile(
+            user_profile, int(timeValue), int(wordValue)
+        )
 
-    svg = render_monkeytype_card(
-        username=username,
-        time_typing=stats["time_typing"],
-        left_stat=stats["time_wpm"],
-        right_stat=stats["words_wpm"],
-        left_acc=stats["time_acc"],
-        right_acc=stats["words_acc"],
-        secondCount=timeValue,
-        wordCount=wordValue,
-        theme=theme,
-    )
-    return _svg_response(svg)
+    if variant == "trend":
+        # Trend cards only read the local history store, never the API
+        with _timed("history"):
+            time_points = services.history.get_series(username, f"time:{timeValue}")
+            word_points = services.history.get_series(username, f"words:{wordValue}")
+        with _timed("render"):
+            svg = render_trend_card(
+                username=username,
+                time_points=time_points,
+                word_points=word_points,
+                left_stat=stats["time_wpm"],
+                right_stat=stats["words_wpm"],
+                secondCount=timeValue,
+                wordCount=wordValue,
+                theme=theme,
+            )
+        return _svg_response(
+            svg, max_age=services.monkeytype.get_cache_max_age(username)
+        )
+
+    with _timed("render"):
+        svg = render_monkeytype_card(
+            username=username,
+            time_typing=stats["time_typing"],
+            left_stat=stats["time_wpm"],
+            right_stat=stats["words_wpm"],
+            left_acc=stats["time_acc"],
+            right_acc=stats["words_acc"],
+            secondCount=timeValue,
+            wordCount=wordValue,
+            theme=theme,
+        )
+    return _svg_response(svg, max_age=services.monkeytype.get_cache_max_age(username))
+
+
+# monkeytype logo, drawn in a 300x180 box at (-680, -1030)
+LOGO_PATHS = (
+    "M -430 -910 L -430 -910 C -424.481 -910 -420 -905.519 -420 -900 L -420 -900 C -420 -894.481 -424.481 -890 -430 -890 L -430 -890 C -435.519 -890 -440 -894.481 -440 -900 L -440 -900 C -440 -905.519 -435.519 -910 -430 -910 Z",
+    "M -570 -910 L -510 -910 C -504.481 -910 -500 -905.519 -500 -900 L -500 -900 C -500 -894.481 -504.481 -890 -510 -890 L -570 -890 C -575.519 -890 -580 -894.481 -580 -900 L -580 -900 C -580 -905.519 -575.519 -910 -570 -910 Z",
+    "M -590 -970 L -590 -970 C -584.481 -970 -580 -965.519 -580 -960 L -580 -940 C -580 -934.481 -584.481 -930 -590 -930 L -590 -930 C -595.519 -930 -600 -934.481 -600 -940 L -600 -960 C -600 -965.519 -595.519 -970 -590 -970 Z",
+    "M -639.991 -960.515 C -639.72 -976.836 -626.385 -990 -610 -990 L -610 -990 C -602.32 -990 -595.31 -987.108 -590 -982.355 C -584.69 -987.108 -577.68 -990 -570 -990 L -570 -990 C -553.615 -990 -540.28 -976.836 -540.009 -960.515 C -540.001 -960.345 -540 -960.172 -540 -960 L -540 -960 L -540 -940 C -540 -934.481 -544.481 -930 -550 -930 L -550 -930 C -555.519 -930 -560 -934.481 -560 -940 L -560 -960 L -560 -960 C -560 -965.519 -564.481 -970 -570 -970 C -575.519 -970 -580 -965.519 -580 -960 L -580 -960 L -580 -960 L -580 -940 C -580 -934.481 -584.481 -930 -590 -930 L -590 -930 C -595.519 -930 -600 -934.481 -600 -940 L -600 -960 L -600 -960 L -600 -960 L -600 -960 L -600 -960 L -600 -960 L -600 -960 L -600 -960 C -600 -965.519 -604.481 -970 -610 -970 C -615.519 -970 -620 -965.519 -620 -960 L -620 -960 L -620 -940 C -620 -934.481 -624.481 -930 -630 -930 L -630 -930 C -635.519 -930 -640 -934.481 -640 -940 L -640 -960 L -640 -960 C -640 -960.172 -639.996 -960.344 -639.991 -960.515 Z",
+    "M -460 -930 L -460 -900 C -460 -894.481 -464.481 -890 -470 -890 L -470 -890 C -475.519 -890 -480 -894.481 -480 -900 L -480 -930 L -508.82 -930 C -514.99 -930 -520 -934.481 -520 -940 L -520 -940 C -520 -945.519 -514.99 -950 -508.82 -950 L -431.18 -950 C -425.01 -950 -420 -945.519 -420 -940 L -420 -940 C -420 -934.481 -425.01 -930 -431.18 -930 L -460 -930 Z",
+    "M -470 -990 L -430 -990 C -424.481 -990 -420 -985.519 -420 -980 L -420 -980 C -420 -974.481 -424.481 -970 -430 -970 L -470 -970 C -475.519 -970 -480 -974.481 -480 -980 L -480 -980 C -480 -985.519 -475.519 -990 -470 -990 Z",
+    "M -630 -910 L -610 -910 C -604.481 -910 -600 -905.519 -600 -900 L -600 -900 C -600 -894.481 -604.481 -890 -610 -890 L -630 -890 C -635.519 -890 -640 -894.481 -640 -900 L -640 -900 C -640 -905.519 -635.519 -910 -630 -910 Z",
+    "M -515 -990 L -510 -990 C -504.481 -990 -500 -985.519 -500 -980 L -500 -980 C -500 -974.481 -504.481 -970 -510 -970 L -515 -970 C -520.519 -970 -525 -974.481 -525 -980 L -525 -980 C -525 -985.519 -520.519 -990 -515 -990 Z",
+    "M -660 -910 L -680 -910 L -680 -980 C -680 -1007.596 -657.596 -1030 -630 -1030 L -430 -1030 C -402.404 -1030 -380 -1007.596 -380 -980 L -380 -900 C -380 -872.404 -402.404 -850 -430 -850 L -630 -850 C -657.596 -850 -680 -872.404 -680 -900 L -680 -920 L -660 -920 L -660 -900 C -660 -883.443 -646.557 -870 -630 -870 L -430 -870 C -413.443 -870 -400 -883.443 -400 -900 L -400 -980 C -400 -996.557 -413.443 -1010 -430 -1010 L -630 -1010 C -646.557 -1010 -660 -996.557 -660 -980 L -660 -910 Z",
+)
+# The same paths with no-op segments dropped and relative/implicit commands,
+# precomputed so compact output doesn't pay for path optimization per request
+LOGO_PATHS_MIN = (
+    "M-430-910c5.519 0 10 4.481 10 10 0 5.519-4.481 10-10 10-5.519 0-10-4.481-10-10 0-5.519 4.481-10 10-10z",
+    "M-570-910h60c5.519 0 10 4.481 10 10 0 5.519-4.481 10-10 10h-60c-5.519 0-10-4.481-10-10 0-5.519 4.481-10 10-10z",
+    "M-590-970c5.519 0 10 4.481 10 10v20c0 5.519-4.481 10-10 10-5.519 0-10-4.481-10-10v-20c0-5.519 4.481-10 10-10z",
+    "M-639.991-960.515C-639.72-976.836-626.385-990-610-990c7.68 0 14.69 2.892 20 7.645 5.31-4.753 12.32-7.645 20-7.645 16.385 0 29.72 13.164 29.991 29.485 .008.17.009.343.009.515v20c0 5.519-4.481 10-10 10-5.519 0-10-4.481-10-10v-20c0-5.519-4.481-10-10-10-5.519 0-10 4.481-10 10v20c0 5.519-4.481 10-10 10-5.519 0-10-4.481-10-10v-20c0-5.519-4.481-10-10-10-5.519 0-10 4.481-10 10v20c0 5.519-4.481 10-10 10-5.519 0-10-4.481-10-10v-20c0-.172.004-.344.009-.515z",
+    "M-460-930v30c0 5.519-4.481 10-10 10-5.519 0-10-4.481-10-10v-30h-28.82c-6.17 0-11.18-4.481-11.18-10 0-5.519 5.01-10 11.18-10h77.64c6.17 0 11.18 4.481 11.18 10 0 5.519-5.01 10-11.18 10H-460z",
+    "M-470-990h40c5.519 0 10 4.481 10 10 0 5.519-4.481 10-10 10h-40c-5.519 0-10-4.481-10-10 0-5.519 4.481-10 10-10z",
+    "M-630-910h20c5.519 0 10 4.481 10 10 0 5.519-4.481 10-10 10h-20c-5.519 0-10-4.481-10-10 0-5.519 4.481-10 10-10z",
+    "M-515-990h5c5.519 0 10 4.481 10 10 0 5.519-4.481 10-10 10h-5c-5.519 0-10-4.481-10-10 0-5.519 4.481-10 10-10z",
+    "M-660-910h-20v-70c0-27.596 22.404-50 50-50h200c27.596 0 50 22.404 50 50v80c0 27.596-22.404 50-50 50H-630c-27.596 0-50-22.404-50-50v-20h20v20c0 16.557 13.443 30 30 30h200c16.557 0 30-13.443 30-30v-80c0-16.557-13.443-30-30-30H-630c-16.557 0-30 13.443-30 30v70z",
+)
 
 
 def render_monkeytype_card(
@@ -221,6 +523,7 @@ def render_monkeytype_card(
     theme,
 ):
     username_esc = escape(username)
+    logo_paths = "\n".join(f'      <path d="{d}"/>' for d in LOGO_PATHS)
 
     svg = f'''<svg xmlns="http://www.w3.org/2000/svg" width="495" height="180" viewBox="0 0 990 360">
   <defs>
@@ -238,15 +541,7 @@ def render_monkeytype_card(
   <!-- Header: logo + wordmark -->
   <g transform="translate(56, 48)">
     <g transform="scale(0.12) translate(680, 1030)" fill="{theme["accent2"]}">
-      <path d="M -430 -910 L -430 -910 C -424.481 -910 -420 -905.519 -420 -900 L -420 -900 C -420 -894.481 -424.481 -890 -430 -890 L -430 -890 C -435.519 -890 -440 -894.481 -440 -900 L -440 -900 C -440 -905.519 -435.519 -910 -430 -910 Z"/>
-      <path d="M -570 -910 L -510 -910 C -504.481 -910 -500 -905.519 -500 -900 L -500 -900 C -500 -894.481 -504.481 -890 -510 -890 L -570 -890 C -575.519 -890 -580 -894.481 -580 -900 L -580 -900 C -580 -905.519 -575.519 -910 -570 -910 Z"/>
-      <path d="M -590 -970 L -590 -970 C -584.481 -970 -580 -965.519 -580 -960 L -580 -940 C -580 -934.481 -584.481 -930 -590 -930 L -590 -930 C -595.519 -930 -600 -934.481 -600 -940 L -600 -960 C -600 -965.519 -595.519 -970 -590 -970 Z"/>
-      <path d="M -639.991 -960.515 C -639.72 -976.836 -626.385 -990 -610 -990 L -610 -990 C -602.32 -990 -595.31 -987.108 -590 -982.355 C -584.69 -987.108 -577.68 -990 -570 -990 L -570 -990 C -553.615 -990 -540.28 -976.836 -540.009 -960.515 C -540.001 -960.345 -540 -960.172 -540 -960 L -540 -960 L -540 -940 C -540 -934.481 -544.481 -930 -550 -930 L -550 -930 C -555.519 -930 -560 -934.481 -560 -940 L -560 -960 L -560 -960 C -560 -965.519 -564.481 -970 -570 -970 C -575.519 -970 -580 -965.519 -580 -960 L -580 -960 L -580 -960 L -580 -940 C -580 -934.481 -584.481 -930 -590 -930 L -590 -930 C -595.519 -930 -600 -934.481 -600 -940 L -600 -960 L -600 -960 L -600 -960 L -600 -960 L -600 -960 L -600 -960 L -600 -960 L -600 -960 C -600 -965.519 -604.481 -970 -610 -970 C -615.519 -970 -620 -965.519 -620 -960 L -620 -960 L -620 -940 C -620 -934.481 -624.481 -930 -630 -930 L -630 -930 C -635.519 -930 -640 -934.481 -640 -940 L -640 -960 L -640 -960 C -640 -960.172 -639.996 -960.344 -639.991 -960.515 Z"/>
-      <path d="M -460 -930 L -460 -900 C -460 -894.481 -464.481 -890 -470 -890 L -470 -890 C -475.519 -890 -480 -894.481 -480 -900 L -480 -930 L -508.82 -930 C -514.99 -930 -520 -934.481 -520 -940 L -520 -940 C -520 -945.519 -514.99 -950 -508.82 -950 L -431.18 -950 C -425.01 -950 -420 -945.519 -420 -940 L -420 -940 C -420 -934.481 -425.01 -930 -431.18 -930 L -460 -930 Z"/>
-      <path d="M -470 -990 L -430 -990 C -424.481 -990 -420 -985.519 -420 -980 L -420 -980 C -420 -974.481 -424.481 -970 -430 -970 L -470 -970 C -475.519 -970 -480 -974.481 -480 -980 L -480 -980 C -480 -985.519 -475.519 -990 -470 -990 Z"/>
-      <path d="M -630 -910 L -610 -910 C -604.481 -910 -600 -905.519 -600 -900 L -600 -900 C -600 -894.481 -604.481 -890 -610 -890 L -630 -890 C -635.519 -890 -640 -894.481 -640 -900 L -640 -900 C -640 -905.519 -635.519 -910 -630 -910 Z"/>
-      <path d="M -515 -990 L -510 -990 C -504.481 -990 -500 -985.519 -500 -980 L -500 -980 C -500 -974.481 -504.481 -970 -510 -970 L -515 -970 C -520.519 -970 -525 -974.481 -525 -980 L -525 -980 C -525 -985.519 -520.519 -990 -515 -990 Z"/>
-      <path d="M -660 -910 L -680 -910 L -680 -980 C -680 -1007.596 -657.596 -1030 -630 -1030 L -430 -1030 C -402.404 -1030 -380 -1007.596 -380 -980 L -380 -900 C -380 -872.404 -402.404 -850 -430 -850 L -630 -850 C -657.596 -850 -680 -872.404 -680 -900 L -680 -920 L -660 -920 L -660 -900 C -660 -883.443 -646.557 -870 -630 -870 L -430 -870 C -413.443 -870 -400 -883.443 -400 -900 L -400 -980 C -400 -996.557 -413.443 -1010 -430 -1010 L -630 -1010 C -646.557 -1010 -660 -996.557 -660 -980 L -660 -910 Z"/>
+{logo_paths}
     </g>
     <text x="46" y="20" fill="{theme["muted"]}" font-size="26" font-weight="400" letter-spacing="1"
           font-family="Lexend Deca, Inter, Segoe UI, sans-serif" opacity="0.8">monkeytype</text>
@@ -308,5 +603,95 @@ def render_monkeytype_card(
     return svg
 
 
+def _sparkline(points, x, y, width, height) -> str:
+    """Scale (ts, value) points into the `points` attribute of a polyline
+    filling the given box. Returns "" if there's nothing to draw."""
+    if len(points) < 2:
+        return ""
+    t_min, t_max = points[0][0], points[-1][0]
+    v_min = min(v for _, v in points)
+    v_max = max(v for _, v in points)
+    t_span = (t_max - t_min) or 1
+    coords = []
+    for t, v in points:
+        px = x + (t - t_min) / t_span * width
+        if v_max == v_min:
+            py = y + height / 2
+        else:
+            py = y + height - (v - v_min) / (v_max - v_min) * height
+        coords.append(f"{px:.1f},{py:.1f}")
+    return " ".join(coords)
+
+
+def _trend_column(x, label, stat, points, theme) -> str:
+    line = _sparkline(points, x, 230, 380, 80)
+    if line:
+        graph = (f'<polyline points="{line}" fill="none" stroke="{theme["accent"]}" '
+                 f'stroke-width="4" stroke-linejoin="round" stroke-linecap="round"/>')
+    else:
+        graph = (f'<text x="{x}" y="280" fill="{theme["muted"]}" font-size="18" font-weight="400"\n'
+                 f'          font-family="Lexend Deca, Inter, Segoe UI, sans-serif" opacity="0.5">not enough history yet</text>')
+    return f'''<g>
+    <text x="{x}" y="130" fill="{theme["muted"]}" font-size="18" font-weight="400" letter-spacing="2"
+          font-family="Lexend Deca, Inter, Segoe UI, sans-serif" opacity="0.6">{label}</text>
+    <text x="{x}" y="200" fill="{theme["accent"]}" font-size="64" font-weight="700" letter-spacing="-2"
+          font-family="Lexend Deca, Inter, Segoe UI, sans-serif">{stat}<tspan fill="{theme["muted"]}" font-size="18" font-weight="400" letter-spacing="1" opacity="0.5"> wpm</tspan></text>
+    {graph}
+  </g>'''
+
+
+def render_trend_card(
+    username,
+    time_points,
+    word_points,
+    left_stat,
+    right_stat,
+    secondCount,
+    wordCount,
+    theme,
+):
+    """Render a card with a pb wpm sparkline for each mode, drawn from the
+    local history store."""
+    username_esc = escape(username)
+    left = _trend_column(56, f"{secondCount} seconds", left_stat, time_points, theme)
+    right = _trend_column(534, f"{wordCount} words", right_stat, word_points, theme)
+
+    return f'''<svg xmlns="http://www.w3.org/2000/svg" width="495" height="180" viewBox="0 0 990 360">
+  <defs>
+    <style>
+      @import url('https://fonts.googleapis.com/css2?family=Lexend+Deca:wght@300;400;500;600;700&amp;display=swap');
+    </style>
+  </defs>
+
+  <!-- Outer background -->
+  <rect width="990" height="360" rx="20" fill="{theme["page_bg"]}"/>
+
+  <!-- Main card -->
+  <rect x="16" y="16" width="958" height="328" rx="16" fill="{theme["card_bg"]}" stroke="{theme["border"]}" stroke-width="2" stroke-opacity="0.5"/>
+
+  <!-- Header: username + caption -->
+  <text x="56" y="72" fill="{theme["accent"]}" font-size="36" font-weight="700" letter-spacing="-1"
+        font-family="Lexend Deca, Inter, Segoe UI, sans-serif">{username_esc}</text>
+  <text x="934" y="72" text-anchor="end" fill="{theme["muted"]}" font-size="20" font-weight="400" letter-spacing="2"
+        font-family="Lexend Deca, Inter, Segoe UI, sans-serif" opacity="0.7">pb trend</text>
+  <line x1="56" y1="88" x2="934" y2="88" stroke="{theme["border"]}" stroke-width="1" stroke-opacity="0.3"/>
+
+  <!-- Time mode trend -->
+  {left}
+
+  <!-- Vertical divider -->
+  <line x1="495" y1="100" x2="495" y2="330" stroke="{theme["border"]}" stroke-width="1" stroke-opacity="0.3"/>
+
+  <!-- Words mode trend -->
+  {right}
+</svg>'''
+
+
+# Opt-in because serverless instances don't keep background threads alive
+if os.environ.get("HOT_WARMER", "0") == "1":
+    services.hotset.prewarm_from_snapshot()
+    services.hotset.start_warmer()
+
+
 if __name__ == "__main__":
     app.run(debug=os.environ.get("FLASK_DEBUG", "0") == "1")
@@ -0,0 +1,95 @@
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+
+# Vercel only lets us write to /tmp, so that's the default home for the store
+HISTORY_DB_PATH = os.environ.get(
+    "HISTORY_DB_PATH",
+    os.path.join(tempfile.gettempdir(), "monkeytypecard-history.sqlite3"),
+)
+HISTORY_FULL_RESOLUTION_DAYS = 7  # keep every point this recent
+HISTORY_BUCKET_SECONDS = 86400  # older points are thinned to one per bucket
+
+_lock = threading.Lock()
+_conn = None  # shared connection, opened on first use
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS points (
+    username TEXT NOT NULL,
+    series TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS points_lookup ON points (username, series, ts);
+"""
+
+
+def _connection() -> sqlite3.Connection:
+    """Return the process-wide connection, creating the schema on first use.
+    Callers must hold _lock."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(HISTORY_DB_PATH, timeout=2, check_same_thread=False)
+        _conn.executescript(_SCHEMA)
+    return _conn
+
+
+def record(username: str, values: dict, ts: float) -> int:
+    """Append one point per series whose value changed since its last point.
+    `values` maps a series name (e.g. "time:15", "timeTyping") to a number.
+    Returns the number of points written."""
+    ts = int(ts)
+    with _lock:
+        conn = _connection()
+        with conn:
+            # SQLite returns the row holding MAX(ts) for the bare `value` column
+            latest = dict(
+                (series, value) for series, value, _ in conn.execute(
+                    "SELECT series, value, MAX(ts) FROM points WHERE username = ? "
+                    "GROUP BY series",
+                    (username,),
+                )
+            )
+            rows = [
+                (username, series, ts, value)
+                for series, value in values.items()
+                if latest.get(series) != value
+            ]
+            if rows:
+                conn.executemany(
+                    "INSERT INTO points (username, series, ts, value) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                _downsample(conn, username, ts)
+    return len(rows)
+
+
+def _downsample(conn: sqlite3.Connection, username: str, now: int) -> None:
+    """Thin a user's points older than the full-resolution window to the last
+    point in each bucket, so old history costs a fixed amount per day."""
+    cutoff = now - HISTORY_FULL_RESOLUTION_DAYS * 86400
+    conn.execute(
+        "DELETE FROM points WHERE username = ? AND ts < ? AND rowid NOT IN ("
+        "  SELECT MAX(rowid) FROM points WHERE username = ? AND ts < ?"
+        "  GROUP BY series, ts / ?"
+        ")",
+        (username, cutoff, username, cutoff, HISTORY_BUCKET_SECONDS),
+    )
+
+
+def get_series(username: str, series: str, since: float = 0, until: float = None) -> list:
+    """Return [(ts, value), ...] for one series, oldest first."""
+    if until is None:
+        until = 2**62
+    try:
+        with _lock:
+            return _connection().execute(
+                "SELECT ts, value FROM points WHERE username = ? AND series = ? "
+                "AND ts BETWEEN ? AND ? ORDER BY ts",
+                (username, series, int(since), int(until)),
+            ).fetchall()
+    except sqlite3.Error as e:
+        logging.warning("Could not read %s history for %s: %s", series, username, e)
+        return []
@@ -0,0 +1,265 @@
+import heapq
+import json
+import logging
+import os
+import tempfile
+import threading
+import time as time_mod
+
+import requests
+
+from services import monkeytype
+
+HOT_CAPACITY = 1000  # usernames tracked by the sketch
+HOT_TOP_K = 300  # usernames kept warm
+HOT_WARM_INTERVAL_SECONDS = 60
+HOT_WARM_BUDGET = 5  # max upstream calls per warm cycle, well under UPSTREAM_BURST
+HOT_REFRESH_AHEAD_SECONDS = 90  # refresh entries expiring within this window
+HOT_STARTUP_DEADLINE_SECONDS = 10  # cap on how long the startup pre-warm may block
+HOT_STARTUP_BUDGET = HOT_TOP_K  # startup warms the whole hot set, bounded by the deadline
+HOT_DECAY_FACTOR = 0.5  # applied to every count once per decay interval so the set follows traffic
+# Cards sit behind GitHub's image proxy and long max-ages, so the origin sees
+# a hot username only every few minutes; halve counts hourly, not per cycle
+HOT_DECAY_INTERVAL_SECONDS = 3600
+HOT_SNAPSHOT_PATH = os.environ.get(
+    "HOT_SNAPSHOT_PATH",
+    os.path.join(tempfile.gettempdir(), "monkeytypecard-hot.json"),
+)
+
+# Stream-summary for the space-saving sketch: usernames are grouped into
+# buckets by count, and a heap of bucket counts finds the smallest in O(log n).
+_lock = threading.Lock()
+_counts = {}  # username -> [count, overestimate]
+_buckets = {}  # count -> {username: None}, insertion-ordered
+_bucket_heap = []  # counts with a bucket, may hold stale entries
+_warmer = None
+
+
+def reset() -> None:
+    """Forget every tracked username."""
+    with _lock:
+        _counts.clear()
+        _buckets.clear()
+        _bucket_heap.clear()
+
+
+def _bucket_add(username: str, count: float) -> None:
+    bucket = _buckets.get(count)
+    if bucket is None:
+        bucket = _buckets[count] = {}
+        heapq.heappush(_bucket_heap, count)
+    bucket[username] = None
+
+
+def _bucket_remove(username: str, count: float) -> None:
+    bucket = _buckets[count]
+    del bucket[username]
+    if not bucket:
+        del _buckets[count]
+
+
+def _set_count(username: str, count: float, error: float) -> None:
+    entry = _counts.get(username)
+    if entry is not None:
+        _bucket_remove(username, entry[0])
+    _counts[username] = [count, error]
+    _bucket_add(username, count)
+
+
+def _pop_least_counted() -> float:
+    """Evict the oldest username in the lowest bucket and return its count."""
+    while _bucket_heap[0] not in _buckets:
+        heapq.heappop(_bucket_heap)
+    count = _bucket_heap[0]
+    victim = next(iter(_buckets[count]))
+    _bucket_remove(victim, count)
+    del _counts[victim]
+    return count
+
+
+def _rebuild_buckets() -> None:
+    _buckets.clear()
+    for username, (count, _) in _counts.items():
+        _buckets.setdefault(count, {})[username] = None
+    _bucket_heap[:] = list(_buckets)
+    heapq.heapify(_bucket_heap)
+
+
+def record_hit(username: str) -> None:
+    """Count a card view using the space-saving algorithm: once the sketch is
+    full, the least-viewed username is replaced and the newcomer inherits its
+    count, so heavy hitters are never undercounted."""
+    with _lock:
+        entry = _counts.get(username)
+        if entry is not None:
+            _set_count(username, entry[0] + 1, entry[1])
+        elif len(_counts) < HOT_CAPACITY:
+            _set_count(username, 1, 0)
+        else:
+            floor = _pop_least_counted()
+            _set_count(username, floor + 1, floor)
+        # Buckets that emptied without reaching the top of the heap pile up; compact now and then
+        if len(_bucket_heap) > 4 * HOT_CAPACITY:
+            _rebuild_buckets()
+
+
+def top(k: int = HOT_TOP_K) -> list:
+    """Return the k most-viewed usernames, most viewed first."""
+    with _lock:
+        ranked = sorted(_counts.items(), key=lambda item: item[1][0], reverse=True)
+    return [name for name, _ in ranked[:k]]
+
+
+def decay(factor: float = HOT_DECAY_FACTOR) -> None:
+    """Scale every count down, dropping usernames that fall below one view."""
+    with _lock:
+        for name in list(_counts):
+            entry = _counts[name]
+            entry[0] *= factor
+            entry[1] *= factor
+            if entry[0] < 1:
+                del _counts[name]
+        _rebuild_buckets()
+
+
+def warm_once(
+    budget: int = HOT_WARM_BUDGET,
+    deadline: float = None,
+    missing_priority: int = monkeytype.PRIORITY_PREWARM,
+) -> int:
+    """Refresh hot profiles that are missing or about to expire, spending at
+    most `budget` upstream calls. Missing profiles are fetched at
+    `missing_priority`. Stops early once the outbound bucket is down to the
+    tokens reserved for user traffic, monkeytype can't be reached, or the
+    monotonic `deadline` passes. Returns the number of calls made."""
+    spent = 0
+    for username in top():
+        if spent >= budget:
+            break
+        if deadline is not None and time_mod.monotonic() >= deadline:
+            break
+        cached = monkeytype.get_cached_profile(username)
+        if cached is not None and monkeytype.get_cache_max_age(username) > HOT_REFRESH_AHEAD_SECONDS:
+            continue
+
+        priority = monkeytype.PRIORITY_REFRESH if cached is not None else missing_priority
+        spent += 1
+        try:
+            monkeytype.get_profile(username, priority=priority, force=True)
+        except monkeytype.UpstreamBudgetExceeded:
+            # Only the user reserve is left, try again next cycle
+            return spent - 1
+        except requests.exceptions.HTTPError as e:
+            logging.warning("Could not warm profile for %s: %s", username, e)
+        except requests.exceptions.RequestException as e:
+            # Monkeytype is unreachable, the rest would just time out too
+            logging.warning("Stopping warm cycle, could not reach monkeytype: %s", e)
+            break
+    return spent
+
+
+def save_snapshot(path: str = None) -> None:
+    """Write the current hot set to disk so a new process can pre-warm it."""
+    path = path or HOT_SNAPSHOT_PATH
+    with _lock:
+        users = sorted(
+            ((name, entry[0]) for name, entry in _counts.items()),
+            key=lambda item: item[1],
+            reverse=True,
+        )[:HOT_TOP_K]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"saved_at": time_mod.time(), "users": users}, f)
+    os.replace(tmp_path, path)
+
+
+def _is_snapshot_entry(item) -> bool:
+    """A snapshot entry is a [username, count] pair."""
+    if not isinstance(item, list) or len(item) != 2:
+        return False
+    name, count = item
+    return (
+        isinstance(name, str)
+        and isinstance(count, (int, float))
+        and not isinstance(count, bool)
+        and count >= 0
+    )
+
+
+def load_snapshot(path: str = None) -> list:
+    """Seed the sketch from a snapshot. Returns the usernames it contained,
+    or an empty list if there's no usable snapshot."""
+    path = path or HOT_SNAPSHOT_PATH
+    try:
+        with open(path) as f:
+            users = json.load(f)["users"]
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning("Ignoring unreadable hot-set snapshot %s: %s", path, e)
+        return []
+
+    if not isinstance(users, list):
+        logging.warning("Ignoring hot-set snapshot %s without a user list", path)
+        return []
+
+    names = []
+    with _lock:
+        for item in users:
+            if not _is_snapshot_entry(item):
+                continue
+            name, count = item
+            if not monkeytype.is_valid_username(name):
+                continue
+            if len(_counts) >= HOT_CAPACITY and name not in _counts:
+                break
+            entry = _counts.get(name, [0, 0])
+            _set_count(name, max(entry[0], count), entry[1])
+            names.append(name)
+    return names
+
+
+def prewarm_from_snapshot(
+    path: str = None,
+    budget: int = HOT_STARTUP_BUDGET,
+    deadline_seconds: float = HOT_STARTUP_DEADLINE_SECONDS,
+) -> int:
+    """Restore the hot set from a snapshot and warm the profile cache with it.
+    Meant to run at startup, before the process takes traffic, so it waits for
+    outbound tokens as they refill but gives up after `deadline_seconds`
+    rather than holding up the process."""
+    if not load_snapshot(path):
+        return 0
+    return warm_once(
+        budget,
+        deadline=time_mod.monotonic() + deadline_seconds,
+        missing_priority=monkeytype.PRIORITY_STARTUP,
+    )
+
+
+def _warm_forever(interval: float) -> None:
+    cycles_per_decay = max(1, round(HOT_DECAY_INTERVAL_SECONDS / interval))
+    cycle = 0
+    while True:
+        time_mod.sleep(interval)
+        try:
+            warm_once()
+        except Exception:
+            logging.exception("Hot-set warm cycle failed")
+        # Snapshot even after a failed cycle so restarts still have a hot set
+        try:
+            save_snapshot()
+        except OSError as e:
+            logging.warning("Could not save hot-set snapshot: %s", e)
+        cycle += 1
+        if cycle % cycles_per_decay == 0:
+            decay()
+
+
+def start_warmer(interval: float = HOT_WARM_INTERVAL_SECONDS) -> None:
+    """Start the background warmer thread, once per process."""
+    global _warmer
+    if _warmer is not None:
+        return
+    _warmer = threading.Thread(target=_warm_forever, args=(interval,), daemon=True)
+    _warmer.start()
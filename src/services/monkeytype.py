@@ -1,34 +1,218 @@
 import requests
 from collections import OrderedDict
+from contextlib import nullcontext
 from datetime import timedelta
+import heapq
+import itertools
+import logging
+import sqlite3
+import threading
 import time as time_mod
 import re
 
+from services import history
+
 _profile_cache = OrderedDict()
-CACHE_TTL_SECONDS = 300  # 5 minutes
+_profile_cache_lock = threading.Lock()  # request threads and the warmer both write
+CACHE_TTL_SECONDS = 300  # 5 minutes, starting TTL for a user we haven't seen change
+CACHE_TTL_MIN_SECONDS = 60
+CACHE_TTL_MAX_SECONDS = 3600
+CACHE_TTL_FACTOR = 2  # TTL grows by this when a refetch shows no change, shrinks when it does
 CACHE_MAX_ENTRIES = 2000
+API_BASE_URL = "https://api.monkeytype.com"
 
+# Outbound budget for api.monkeytype.com, shared by every caller in the process.
+# Lower number = higher priority.
+PRIORITY_USER = 0  # cache miss for a card someone is waiting on
+PRIORITY_REFRESH = 1  # background refresh of an entry that is about to expire
+PRIORITY_PREWARM = 2  # speculative warming of profiles nobody asked for yet
+PRIORITY_STARTUP = 3  # pre-warm from the hot-set snapshot before taking traffic
 
-def get_profile(username: str):
-    """Fetch a user's public profile from the monkeytype API.
-    Returns cached response if available and fresh."""
-    now = time_mod.time()
-    cached = _profile_cache.get(username)
+UPSTREAM_RATE_PER_SECOND = 1.0  # sustained upstream calls per second
+UPSTREAM_BURST = 20  # bucket size, i.e. calls allowed back-to-back
+UPSTREAM_QUEUE_MAX = 50  # callers allowed to wait for a token at once
+UPSTREAM_USER_RESERVE = 5  # tokens only PRIORITY_USER may spend
+# How long each priority may wait for a token before it is shed.
+UPSTREAM_MAX_WAIT_SECONDS = {
+    PRIORITY_USER: 3.0,
+    PRIORITY_REFRESH: 0.5,
+    PRIORITY_PREWARM: 0.0,
+    # No one is waiting yet, so startup can wait for the bucket to refill
+    PRIORITY_STARTUP: 2.0,
+}
+
+_upstream_bucket = {"tokens": float(UPSTREAM_BURST), "ts": time_mod.monotonic()}
+_upstream_queue = []  # heap of [priority, seq, active]
+_upstream_seq = itertools.count()
+_upstream_cond = threading.Condition()
+
+
+def _untimed(phase: str):
+    return nullcontext()
+
+
+_phase_timer = _untimed
+
+
+def set_phase_timer(timer) -> None:
+    """Let the web layer time the phases of an upstream fetch.
+    `timer(phase)` must return a context manager."""
+    global _phase_timer
+    _phase_timer = timer
+
+
+class UpstreamBudgetExceeded(requests.exceptions.RequestException):
+    """Raised when a call to the monkeytype API is shed by the outbound budget."""
+
+
+def _refill_upstream_bucket(now: float) -> None:
+    elapsed = max(0.0, now - _upstream_bucket["ts"])
+    _upstream_bucket["tokens"] = min(
+        float(UPSTREAM_BURST),
+        _upstream_bucket["tokens"] + elapsed * UPSTREAM_RATE_PER_SECOND,
+    )
+    _upstream_bucket["ts"] = now
+
+
+def _drop_waiter(entry: list) -> None:
+    entry[2] = False
+    try:
+        _upstream_queue.remove(entry)
+    except ValueError:
+        return
+    heapq.heapify(_upstream_queue)
+
+
+def acquire_upstream(priority: int = PRIORITY_USER) -> None:
+    """Take one token from the outbound budget, waiting in priority order.
+    Background priorities can't dip into the last UPSTREAM_USER_RESERVE tokens.
+    Raises UpstreamBudgetExceeded if the caller is shed, either because the
+    queue is full of more important work or its wait limit ran out."""
+    max_wait = UPSTREAM_MAX_WAIT_SECONDS.get(priority, 0.0)
+    needed = 1 if priority == PRIORITY_USER else 1 + UPSTREAM_USER_RESERVE
+    deadline = time_mod.monotonic() + max_wait
+    entry = [priority, next(_upstream_seq), True]
+
+    with _upstream_cond:
+        if len(_upstream_queue) >= UPSTREAM_QUEUE_MAX:
+            # Make room by shedding the least important waiter, unless that's us
+            worst = max(_upstream_queue)
+            if worst[:2] <= entry[:2]:
+                raise UpstreamBudgetExceeded("upstream queue is full")
+            _drop_waiter(worst)
+            _upstream_cond.notify_all()
+        heapq.heappush(_upstream_queue, entry)
+
+        try:
+            while True:
+                if not entry[2]:
+                    raise UpstreamBudgetExceeded("shed for higher-priority work")
 
-    if cached and (now - cached["ts"]) < CACHE_TTL_SECONDS:
+                now = time_mod.monotonic()
+                _refill_upstream_bucket(now)
+                if _upstream_queue[0] is entry and _upstream_bucket["tokens"] >= needed:
+                    _upstream_bucket["tokens"] -= 1
+                    return
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise UpstreamBudgetExceeded("upstream budget exhausted")
+                next_token = (needed - _upstream_bucket["tokens"]) / UPSTREAM_RATE_PER_SECOND
+                _upstream_cond.wait(min(remaining, max(next_token, 0.01)))
+        finally:
+            _drop_waiter(entry)
+            _upstream_cond.notify_all()
+
+
+def get_cached_profile(username: str):
+    """Return the cached profile for a user if it is still fresh, else None."""
+    cached = _profile_cache.get(username)
+    if cached and (time_mod.time() - cached["ts"]) < cached.get("ttl", CACHE_TTL_SECONDS):
         return cached["data"]
+    return None
+
+
+def get_cache_max_age(username: str) -> int:
+    """Seconds until the user's cached profile expires, for Cache-Control.
+    Falls back to the default TTL for users that aren't cached."""
+    cached = _profile_cache.get(username)
+    if not cached:
+        return CACHE_TTL_SECONDS
+    ttl = cached.get("ttl", CACHE_TTL_SECONDS)
+    return max(0, int(ttl - (time_mod.time() - cached["ts"])))
+
+
+def _next_ttl(previous: dict, values: dict) -> float:
+    """Adapt a user's TTL to how often their PBs and time typing change:
+    back off while refetches keep finding nothing new, tighten when they do."""
+    if not previous:
+        return CACHE_TTL_SECONDS
+    ttl = previous.get("ttl", CACHE_TTL_SECONDS)
+    if previous.get("values") == values:
+        ttl *= CACHE_TTL_FACTOR
+    else:
+        ttl /= CACHE_TTL_FACTOR
+    return min(CACHE_TTL_MAX_SECONDS, max(CACHE_TTL_MIN_SECONDS, ttl))
+
+
+def _store_profile(username: str, entry: dict) -> None:
+    """Insert a cache entry as most recently used and evict the oldest ones."""
+    with _profile_cache_lock:
+        _profile_cache[username] = entry
+        _profile_cache.move_to_end(username)
+        while len(_profile_cache) > CACHE_MAX_ENTRIES:
+            _profile_cache.popitem(last=False)
 
-    url = f"https://api.monkeytype.com/users/{username}/profile"
+
+def get_profile(username: str, priority: int = PRIORITY_USER, force: bool = False):
+    """Fetch a user's public profile from the monkeytype API.
+    Returns cached response if available and fresh, unless `force` is set to
+    refresh it early. Misses go through the outbound budget at the given priority."""
+    if not force:
+        cached = get_cached_profile(username)
+        if cached is not None:
+            return cached
+
+    now = time_mod.time()
+    url = f"{API_BASE_URL}/users/{username}/profile"
     params = {"isUid": "false"}
 
-    r = requests.get(url, params=params, timeout=5)
-    r.raise_for_status()
-    data = r.json()
+    # Revalidate an expired entry instead of refetching it when we have validators
+    stale = _profile_cache.get(username)
+    headers = {}
+    if stale:
+        if stale.get("etag"):
+            headers["If-None-Match"] = stale["etag"]
+        if stale.get("last_modified"):
+            headers["If-Modified-Since"] = stale["last_modified"]
+
+    with _phase_timer("budget"):
+        acquire_upstream(priority)
+    with _phase_timer("upstream"):
+        r = requests.get(url, params=params, headers=headers, timeout=5)
+        if r.status_code == 304 and headers:
+            _store_profile(username, {
+                **stale, "ts": now, "ttl": _next_ttl(stale, stale.get("values"))
+            })
+            return stale["data"]
+        r.raise_for_status()
+        data = r.json()
+    values = get_history_values(data)
 
-    _profile_cache[username] = {"data": data, "ts": now}
-    _profile_cache.move_to_end(username)
-    while len(_profile_cache) > CACHE_MAX_ENTRIES:
-        _profile_cache.popitem(last=False)
+    _store_profile(username, {
+        "data": data,
+        "ts": now,
+        "ttl": _next_ttl(stale, values),
+        "values": values,
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+    })
+
+    try:
+        with _phase_timer("record"):
+            history.record(username, values, now)
+    except sqlite3.Error as e:
+        logging.warning("Could not record history for %s: %s", username, e)
     return data
 
 
@@ -64,6 +248,23 @@ def is_valid_username(username: str) -> bool:
     return bool(USERNAME_RE.match(username))
 
 
+def get_history_values(profile_json) -> dict:
+    """Flatten a profile into the series tracked by the history store:
+    the best wpm for every time/words PB plus total time typing."""
+    data = profile_json.get("data", {})
+    pbs = data.get("personalBests") or {}
+    values = {}
+    for mode in ("time", "words"):
+        for mode2, results in (pbs.get(mode) or {}).items():
+            best = best_result(results)
+            if best is not None:
+                values[f"{mode}:{mode2}"] = float(best.get("wpm", 0))
+    time_typing = (data.get("typingStats") or {}).get("timeTyping")
+    if isinstance(time_typing, (int, float)):
+        values["timeTyping"] = float(time_typing)
+    return values
+
+
 def get_card_stats_from_profile(profile_json, time_value: int, word_value: int) -> dict:
     """Extract the best wpm/acc for the given time and word modes from a profile."""
     data = profile_json.get("data", {})
@@ -14,6 +14,8 @@ const themeSearch = document.getElementById("themeSearch");
 const randBtn = document.getElementById("randomTheme");
 
 let themes = [];
+let cardTemplate = null;
+const statsCache = new Map(); // username -> /api/stats response
 
 function buildUrl() {
   const params = new URLSearchParams({
@@ -21,20 +23,117 @@ function buildUrl() {
     theme: themeEl.value,
     wordValue: wordValueEl.value,
     timeValue: timeValueEl.value,
+    compact: "1",
   });
   return `${window.location.origin}/monkeytype.svg?${params.toString()}`;
 }
 
-// Show loading state while the SVG fetches, error state if it fails
-function preview() {
-  const url = buildUrl();
+function escapeXml(s) {
+  return String(s)
+    .replace(/&/g, "&amp;")
+    .replace(/</g, "&lt;")
+    .replace(/>/g, "&gt;")
+    .replace(/"/g, "&quot;")
+    .replace(/'/g, "&apos;");
+}
+
+// Mirrors theme_to_card_colors in app.py
+function cardColors(t) {
+  return {
+    page_bg: t.subAltColor,
+    card_bg: t.bgColor,
+    border: t.subColor,
+    fg: t.textColor,
+    muted: t.subColor,
+    accent: t.mainColor,
+    accent2: t.caretColor,
+  };
+}
+
+function showPreviewError(msg) {
+  previewCard.classList.remove("loading");
+  previewCard.classList.add("error");
+  previewCard.setAttribute("data-error", msg);
+  previewImg.removeAttribute("src");
+}
+
+// Fill the shared card template locally, so theme and mode changes
+// don't cost a server render or count against the rate limit
+function renderLocal(stats) {
+  const theme = themes.find((t) => t.name === themeEl.value) || themes[0];
+  const time = stats.time[timeValueEl.value] || { wpm: "--", acc: "--" };
+  const words = stats.words[wordValueEl.value] || { wpm: "--", acc: "--" };
+  const values = {
+    ...cardColors(theme),
+    username: stats.username,
+    time_typing: stats.time_typing,
+    left_stat: time.wpm,
+    right_stat: words.wpm,
+    left_acc: time.acc,
+    right_acc: words.acc,
+    secondCount: timeValueEl.value,
+    wordCount: wordValueEl.value,
+  };
+  const svg = cardTemplate.replace(/\{\{(\w+)\}\}/g, (_, key) =>
+    escapeXml(values[key] ?? ""),
+  );
 
-  previewCard.classList.add("loading");
   previewCard.classList.remove("error");
   previewCard.removeAttribute("data-error");
+  previewImg.src = "data:image/svg+xml;charset=utf-8," + encodeURIComponent(svg);
+}
 
-  previewImg.src = url;
+async function loadStats(username) {
+  if (statsCache.has(username)) return statsCache.get(username);
+  const res = await fetch(`/api/stats?${new URLSearchParams({ username })}`);
+  const stats = await res.json();
+  // Don't cache transient failures like rate limiting
+  if (res.ok) statsCache.set(username, stats);
+  return stats;
+}
+
+// Show loading state while stats fetch, error state if they fail
+async function preview() {
+  const url = buildUrl();
   output.value = url;
+
+  // Fall back to a server render if the template couldn't be loaded
+  if (!cardTemplate || themes.length === 0) {
+    previewCard.classList.add("loading");
+    previewCard.classList.remove("error");
+    previewCard.removeAttribute("data-error");
+    previewImg.src = url;
+    return;
+  }
+
+  const username = usernameEl.value.trim();
+  if (!username) {
+    showPreviewError("enter a username");
+    return;
+  }
+
+  if (!statsCache.has(username)) {
+    previewCard.classList.add("loading");
+    previewCard.classList.remove("error");
+  }
+  try {
+    const stats = await loadStats(username);
+    // A newer username may have been typed while this one was loading
+    if (username !== usernameEl.value.trim()) return;
+    if (stats.error) {
+      showPreviewError(stats.error);
+      return;
+    }
+    renderLocal(stats);
+  } catch {
+    showPreviewError("could not load card");
+  }
+}
+
+let renderTimer;
+function schedulePreview(delay = 50) {
+  clearTimeout(renderTimer);
+  renderTimer = setTimeout(preview, delay);
 }
 
 // Clear loading state once the image loads successfully
@@ -44,9 +143,8 @@ previewImg.addEventListener("load", () => {
 
 // Show error message inside the preview area if the image fails
 previewImg.addEventListener("error", () => {
-  previewCard.classList.remove("loading");
-  previewCard.classList.add("error");
-  previewCard.setAttribute("data-error", "could not load card");
+  if (!previewImg.getAttribute("src")) return;
+  showPreviewError("could not load card");
 });
 
 function showToast(msg) {
@@ -107,7 +205,7 @@ function renderThemes(filter = "") {
         .querySelectorAll(".theme-btn")
         .forEach((b) => b.classList.remove("active"));
       btn.classList.add("active");
-      preview();
+      schedulePreview();
     });
 
     themeGrid.appendChild(btn);
@@ -120,6 +218,15 @@ async function loadThemes() {
   renderThemes();
 }
 
+async function loadCardTemplate() {
+  try {
+    const res = await fetch("/api/card-template");
+    if (res.ok) cardTemplate = await res.text();
+  } catch {
+    cardTemplate = null;
+  }
+}
+
 themeSearch.addEventListener("input", () => {
   renderThemes(themeSearch.value);
 });
@@ -157,19 +264,16 @@ randBtn.addEventListener("click", () => {
     activeBtn.classList.add("active");
     activeBtn.scrollIntoView({ behavior: "smooth", block: "center" });
   }
-  preview();
+  schedulePreview();
 });
 
 // Auto-preview on control change
 [usernameEl, wordValueEl, timeValueEl].forEach((el) => {
-  el.addEventListener("change", preview);
+  el.addEventListener("change", () => schedulePreview());
 });
 
-let debounce;
-usernameEl.addEventListener("input", () => {
-  clearTimeout(debounce);
-  debounce = setTimeout(preview, 400);
-});
+// Username changes may need a stats fetch, so wait for typing to settle
+usernameEl.addEventListener("input", () => schedulePreview(400));
 
 document.getElementById("themeToggle").addEventListener("click", () => {
   document.body.classList.toggle("light");
@@ -178,4 +282,4 @@ document.getElementById("themeToggle").addEventListener("click", () => {
 });
 
 // Init
-loadThemes().then(preview);
+Promise.all([loadThemes(), loadCardTemplate()]).then(preview);
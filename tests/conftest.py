@@ -6,6 +6,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
 
 import pytest
 import app as app_module
+import services.history as history_service
+import services.hotset as hotset_service
 import services.monkeytype as mt_service
 
 
@@ -31,3 +33,32 @@ def _clear_profile_cache():
     mt_service._profile_cache.clear()
     yield
     mt_service._profile_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def _reset_upstream_budget():
+    """Refill the outbound token bucket and empty its queue between tests."""
+    mt_service._upstream_bucket["tokens"] = float(mt_service.UPSTREAM_BURST)
+    mt_service._upstream_queue.clear()
+    yield
+    mt_service._upstream_bucket["tokens"] = float(mt_service.UPSTREAM_BURST)
+    mt_service._upstream_queue.clear()
+
+
+@pytest.fixture(autouse=True)
+def _isolated_history_db(tmp_path, monkeypatch):
+    """Point the stats history store at a fresh database for each test."""
+    monkeypatch.setattr(history_service, "HISTORY_DB_PATH", str(tmp_path / "history.sqlite3"))
+    monkeypatch.setattr(history_service, "_conn", None)
+    yield
+    if history_service._conn is not None:
+        history_service._conn.close()
+
+
+@pytest.fixture(autouse=True)
+def _reset_hot_set(tmp_path, monkeypatch):
+    """Start each test with an empty hot-set sketch and a private snapshot path."""
+    monkeypatch.setattr(hotset_service, "HOT_SNAPSHOT_PATH", str(tmp_path / "hot.json"))
+    hotset_service.reset()
+    yield
+    hotset_service.reset()
@@ -1,4 +1,8 @@
+import re
 from unittest.mock import patch
+from xml.etree import ElementTree
+
+import pytest
 
 import app as app_module
 
@@ -64,6 +68,19 @@ class TestRenderErrorSvg:
         assert "#f00" in svg  # accent
 
 
+class TestSparkline:
+    def test_too_few_points(self):
+        assert app_module._sparkline([(0, 100)], 0, 0, 100, 10) == ""
+
+    def test_scales_into_box(self):
+        line = app_module._sparkline([(0, 100), (5, 150), (10, 200)], 10, 20, 100, 50)
+        assert line == "10.0,70.0 60.0,45.0 110.0,20.0"
+
+    def test_flat_series_is_centered(self):
+        line = app_module._sparkline([(0, 100), (10, 100)], 0, 0, 100, 50)
+        assert line == "0.0,25.0 100.0,25.0"
+
+
 class TestIsRateLimited:
     def test_under_limit_returns_false(self):
         assert app_module._is_rate_limited("1.2.3.4") is False
@@ -106,3 +123,111 @@ class TestIsRateLimited:
             assert "10.0.0.3" in app_module._rate_limits
         finally:
             app_module.RATE_LIMIT_MAX_IPS = original_max
+
+
+def _path_segments(d):
+    """Expand a path into absolute M/L/C/Z segments, dropping no-op lines,
+    so differently-written paths that draw the same shape compare equal."""
+    tokens = re.findall(r"[MmLlHhVvCcZz]|-?(?:\d+\.?\d*|\.\d+)", d)
+    arity = {"m": 2, "l": 2, "h": 1, "v": 1, "c": 6, "z": 0}
+    segments = []
+    x = y = start_x = start_y = 0.0
+    i = 0
+    cmd = None
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            cmd = tokens[i]
+            i += 1
+        args = [float(t) for t in tokens[i:i + arity[cmd.lower()]]]
+        i += arity[cmd.lower()]
+        rel = cmd.islower()
+        op = cmd.lower()
+        if op == "z":
+            segments.append(("Z",))
+            x, y = start_x, start_y
+            continue
+        if op == "h":
+            args = [args[0], 0.0 if rel else y]
+        elif op == "v":
+            args = [0.0 if rel else x, args[0]]
+        if rel:
+            args = [a + (x if j % 2 == 0 else y) for j, a in enumerate(args)]
+        args = [round(a, 3) for a in args]
+        if op == "m":
+            segments.append(("M", *args))
+            start_x, start_y = args
+            cmd = "l" if rel else "L"  # implicit commands after a moveto are lines
+        elif op in ("l", "h", "v"):
+            if (args[0], args[1]) != (round(x, 3), round(y, 3)):
+                segments.append(("L", *args))
+        else:
+            segments.append(("C", *args))
+        x, y = args[-2], args[-1]
+    return segments
+
+
+def _resolved_elements(svg):
+    """Flatten an SVG into (tag, effective attributes, text) per drawn element,
+    applying any class/tag rules from its <style> block."""
+    root = ElementTree.fromstring(svg)
+    style = root.find(f".//{{{app_module.SVG_NS}}}style")
+    css = re.sub(r"@import[^;]+;", "", style.text or "") if style is not None else ""
+    rules = {
+        selector: dict(decl.split(":", 1) for decl in body.split(";"))
+        for selector, body in re.findall(r"([.\w-]+)\{([^}]*)\}", css)
+    }
+
+    elements = []
+    for el in root.iter():
+        tag = el.tag.rsplit("}", 1)[-1]
+        if tag in ("defs", "style"):
+            continue
+        attrs = dict(el.attrib)
+        cls = attrs.pop("class", None)
+        for selector in (tag, f".{cls}"):
+            for name, value in rules.get(selector, {}).items():
+                if name in app_module.COMPACT_PX_ATTRS:
+                    value = value.removesuffix("px")
+                attrs[name] = value
+        if "d" in attrs:
+            attrs["d"] = _path_segments(attrs["d"])
+        elements.append((tag, attrs, (el.text or "").strip()))
+    return elements
+
+
+class TestLogoPaths:
+    def test_minimal_paths_draw_the_same_shapes(self):
+        for full, minimal in zip(app_module.LOGO_PATHS, app_module.LOGO_PATHS_MIN):
+            assert _path_segments(minimal) == _path_segments(full)
+            assert len(minimal) < len(full)
+
+
+class TestMinifySvg:
+    @pytest.mark.parametrize("theme_name", sorted(app_module.THEMES))
+    def test_card_renders_the_same_and_is_smaller(self, theme_name):
+        theme = app_module.theme_to_card_colors(app_module.THEMES[theme_name])
+        full = app_module.render_monkeytype_card(
+            "test<user>", "01:01:01", 120, 130, 97, 98, "15", "10", theme
+        )
+        compact = app_module.minify_svg(full)
+
+        assert _resolved_elements(compact) == _resolved_elements(full)
+        saved = 1 - len(compact.encode()) / len(full.encode())
+        assert saved > 0.4, f"{theme_name}: {len(full)} -> {len(compact)} bytes"
+
+    def test_error_svg_renders_the_same(self):
+        theme = app_module.theme_to_card_colors(app_module.THEMES["serika_dark"])
+        full = app_module.render_error_svg("invalid username", theme)
+        compact = app_module.minify_svg(full)
+        assert _resolved_elements(compact) == _resolved_elements(full)
+        assert len(compact) < len(full)
+
+    def test_drops_comments_and_whitespace(self):
+        theme = app_module.theme_to_card_colors(app_module.THEMES["serika_dark"])
+        compact = app_module.minify_svg(app_module.render_monkeytype_card(
+            "u", "00:00:00", 1, 2, 3, 4, "15", "10", theme
+        ))
+        assert "<!--" not in compact
+        assert "\n" not in compact
+        assert "font-family=" not in compact
+        assert compact.count("Lexend Deca, Inter") == 1
@@ -0,0 +1,85 @@
+import services.history as history_service
+import services.monkeytype as mt_service
+
+DAY = 86400
+
+
+class TestRecord:
+    def test_round_trip(self):
+        history_service.record("bob", {"time:15": 100.0, "timeTyping": 60.0}, 1000)
+        assert history_service.get_series("bob", "time:15") == [(1000, 100.0)]
+        assert history_service.get_series("bob", "timeTyping") == [(1000, 60.0)]
+
+    def test_unchanged_values_are_not_appended(self):
+        history_service.record("bob", {"time:15": 100.0}, 1000)
+        written = history_service.record("bob", {"time:15": 100.0}, 2000)
+        assert written == 0
+        assert history_service.get_series("bob", "time:15") == [(1000, 100.0)]
+
+    def test_users_are_separate(self):
+        history_service.record("bob", {"time:15": 100.0}, 1000)
+        history_service.record("amy", {"time:15": 90.0}, 1000)
+        assert history_service.get_series("amy", "time:15") == [(1000, 90.0)]
+
+
+class TestConnection:
+    def test_schema_created_once_per_connection(self):
+        history_service.record("bob", {"time:15": 100.0}, 1000)
+        conn = history_service._conn
+        history_service.record("bob", {"time:15": 110.0}, 2000)
+        history_service.get_series("bob", "time:15")
+        assert history_service._conn is conn
+
+
+class TestGetSeries:
+    def test_range_query(self):
+        for i in range(5):
+            history_service.record("bob", {"time:15": 100.0 + i}, 1000 + i * 10)
+        points = history_service.get_series("bob", "time:15", since=1010, until=1030)
+        assert points == [(1010, 101.0), (1020, 102.0), (1030, 103.0)]
+
+    def test_unknown_series_is_empty(self):
+        assert history_service.get_series("nobody", "time:15") == []
+
+
+class TestDownsample:
+    def test_old_points_thinned_to_one_per_day(self):
+        start = 100 * DAY
+        # Four points on the same old day, then one recent write triggers compaction
+        for i in range(4):
+            history_service.record("bob", {"time:15": 100.0 + i}, start + i * 60)
+        now = start + (history_service.HISTORY_FULL_RESOLUTION_DAYS + 2) * DAY
+        history_service.record("bob", {"time:15": 110.0}, now)
+
+        points = history_service.get_series("bob", "time:15")
+        assert points == [(start + 180, 103.0), (now, 110.0)]
+
+    def test_recent_points_kept(self):
+        start = 100 * DAY
+        for i in range(4):
+            history_service.record("bob", {"time:15": 100.0 + i}, start + i * 60)
+        assert len(history_service.get_series("bob", "time:15")) == 4
+
+
+class TestGetHistoryValues:
+    def test_flattens_best_pbs_and_time_typing(self):
+        profile = {
+            "data": {
+                "personalBests": {
+                    "time": {"15": [{"wpm": 90}, {"wpm": 120}]},
+                    "words": {"10": [{"wpm": 130}], "25": []},
+                },
+                "typingStats": {"timeTyping": 3661},
+            }
+        }
+        assert mt_service.get_history_values(profile) == {
+            "time:15": 120.0,
+            "words:10": 130.0,
+            "timeTyping": 3661.0,
+        }
+
+    def test_private_profile_has_no_values(self):
+        assert mt_service.get_history_values({"data": {}}) == {}
+
+    def test_null_personal_bests_has_no_values(self):
+        assert mt_service.get_history_values({"data": {"personalBests": None}}) == {}
@@ -0,0 +1,271 @@
+import random
+from unittest.mock import patch, MagicMock
+
+import requests.exceptions
+
+import services.hotset as hotset_service
+import services.monkeytype as mt_service
+
+PROFILE = {"data": {"personalBests": {"time": {"15": [{"wpm": 100, "acc": 95}]}}}}
+
+
+def _cache(username, age=0, ttl=300):
+    mt_service._profile_cache[username] = {
+        "data": PROFILE, "ts": mt_service.time_mod.time() - age, "ttl": ttl
+    }
+
+
+class TestSketch:
+    def test_top_orders_by_views(self):
+        for name, views in (("a", 3), ("b", 5), ("c", 1)):
+            for _ in range(views):
+                hotset_service.record_hit(name)
+        assert hotset_service.top(2) == ["b", "a"]
+
+    def test_heavy_hitters_survive_a_long_tail(self):
+        with patch.object(hotset_service, "HOT_CAPACITY", 10):
+            for i in range(500):
+                hotset_service.record_hit("popular")
+                hotset_service.record_hit(f"tail{i}")
+            assert len(hotset_service._counts) == 10
+            assert hotset_service.top(1) == ["popular"]
+
+    def test_newcomer_inherits_evicted_count(self):
+        with patch.object(hotset_service, "HOT_CAPACITY", 1):
+            hotset_service.record_hit("a")
+            hotset_service.record_hit("a")
+            hotset_service.record_hit("b")
+        assert hotset_service._counts == {"b": [3, 2]}
+
+    def test_decay_drops_cold_usernames(self):
+        for _ in range(4):
+            hotset_service.record_hit("hot")
+        hotset_service.record_hit("cold")
+        hotset_service.decay(0.5)
+        assert hotset_service.top() == ["hot"]
+
+
+class TestWarmerDecay:
+    @patch.object(hotset_service, "save_snapshot")
+    @patch.object(hotset_service, "warm_once")
+    def test_usernames_seen_every_few_minutes_stay_hot(self, mock_warm, mock_save):
+        class Stop(Exception):
+            pass
+
+        minutes = iter(range(180))
+        names = [f"user{i}" for i in range(300)]
+
+        def one_minute(_):
+            minute = next(minutes, None)
+            if minute is None:
+                raise Stop
+            # Each username is viewed once every 5 minutes, staggered
+            for name in names[minute % 5::5]:
+                hotset_service.record_hit(name)
+
+        with patch.object(hotset_service.time_mod, "sleep", side_effect=one_minute):
+            try:
+                hotset_service._warm_forever(60)
+            except Stop:
+                pass
+
+        assert sorted(hotset_service.top()) == sorted(names)
+
+
+class TestStreamSummary:
+    def _assert_consistent(self):
+        from_buckets = {
+            name: count for count, names in hotset_service._buckets.items() for name in names
+        }
+        assert from_buckets == {name: e[0] for name, e in hotset_service._counts.items()}
+
+    def test_buckets_track_counts_through_evictions_and_decay(self):
+        rng = random.Random(7)
+        with patch.object(hotset_service, "HOT_CAPACITY", 20):
+            for _ in range(5000):
+                hotset_service.record_hit(f"u{int(rng.paretovariate(1.2))}")
+            self._assert_consistent()
+            # Space-saving keeps the total count equal to the stream length
+            assert sum(e[0] for e in hotset_service._counts.values()) == 5000
+            assert hotset_service.top(1) == ["u1"]
+
+            hotset_service.decay(0.5)
+            self._assert_consistent()
+            for _ in range(500):
+                hotset_service.record_hit(f"tail{rng.randrange(1000)}")
+            self._assert_consistent()
+
+    def test_evicts_from_the_lowest_bucket(self):
+        with patch.object(hotset_service, "HOT_CAPACITY", 3):
+            for name, views in (("a", 3), ("b", 1), ("c", 2)):
+                for _ in range(views):
+                    hotset_service.record_hit(name)
+            hotset_service.record_hit("d")
+        assert "b" not in hotset_service._counts
+        assert hotset_service._counts["d"] == [2, 1]
+
+
+class TestWarmOnce:
+    @patch("services.monkeytype.get_profile")
+    def test_skips_fresh_and_warms_expiring(self, mock_gp):
+        for name in ("fresh", "expiring", "missing"):
+            hotset_service.record_hit(name)
+        _cache("fresh")
+        _cache("expiring", age=250)
+
+        assert hotset_service.warm_once() == 2
+        calls = {c.args[0]: c.kwargs["priority"] for c in mock_gp.call_args_list}
+        assert calls == {
+            "expiring": mt_service.PRIORITY_REFRESH,
+            "missing": mt_service.PRIORITY_PREWARM,
+        }
+        assert all(c.kwargs["force"] for c in mock_gp.call_args_list)
+
+    @patch("services.monkeytype.get_profile")
+    def test_respects_budget(self, mock_gp):
+        for i in range(5):
+            hotset_service.record_hit(f"user{i}")
+        assert hotset_service.warm_once(budget=2) == 2
+        assert mock_gp.call_count == 2
+
+    @patch("services.monkeytype.get_profile")
+    def test_stops_when_upstream_budget_is_exhausted(self, mock_gp):
+        mock_gp.side_effect = mt_service.UpstreamBudgetExceeded("budget")
+        for i in range(5):
+            hotset_service.record_hit(f"user{i}")
+        assert hotset_service.warm_once() == 0
+        assert mock_gp.call_count == 1
+
+    @patch("services.monkeytype.get_profile")
+    def test_upstream_errors_do_not_stop_the_cycle(self, mock_gp):
+        mock_gp.side_effect = requests.exceptions.HTTPError(response=MagicMock(status_code=404))
+        for i in range(3):
+            hotset_service.record_hit(f"user{i}")
+        assert hotset_service.warm_once() == 3
+
+
+class TestWarmStops:
+    @patch("services.monkeytype.get_profile")
+    def test_stops_after_network_failure(self, mock_gp):
+        mock_gp.side_effect = requests.exceptions.ConnectionError("down")
+        for i in range(5):
+            hotset_service.record_hit(f"user{i}")
+        assert hotset_service.warm_once() == 1
+        assert mock_gp.call_count == 1
+
+    @patch("services.monkeytype.get_profile")
+    def test_respects_deadline(self, mock_gp):
+        for i in range(5):
+            hotset_service.record_hit(f"user{i}")
+        deadline = mt_service.time_mod.monotonic() - 1
+        assert hotset_service.warm_once(deadline=deadline) == 0
+        mock_gp.assert_not_called()
+
+    @patch("services.monkeytype.get_profile")
+    def test_startup_prewarm_gives_up_at_deadline(self, mock_gp):
+        mock_gp.side_effect = lambda *a, **kw: mt_service.time_mod.sleep(0.05)
+        for i in range(5):
+            hotset_service.record_hit(f"user{i}")
+        hotset_service.save_snapshot()
+        hotset_service.reset()
+
+        assert hotset_service.prewarm_from_snapshot(budget=5, deadline_seconds=0.08) == 2
+
+
+class TestSnapshot:
+    def test_round_trip(self):
+        for _ in range(3):
+            hotset_service.record_hit("alice")
+        hotset_service.record_hit("bob")
+        hotset_service.save_snapshot()
+
+        hotset_service.reset()
+        assert hotset_service.load_snapshot() == ["alice", "bob"]
+        assert hotset_service.top() == ["alice", "bob"]
+
+    def test_missing_snapshot(self):
+        assert hotset_service.load_snapshot() == []
+
+    def test_corrupt_snapshot_is_ignored(self):
+        with open(hotset_service.HOT_SNAPSHOT_PATH, "w") as f:
+            f.write("{not json")
+        assert hotset_service.load_snapshot() == []
+
+    def test_invalid_usernames_are_skipped(self):
+        with open(hotset_service.HOT_SNAPSHOT_PATH, "w") as f:
+            f.write('{"users": [["ok", 2], ["bad name!", 5]]}')
+        assert hotset_service.load_snapshot() == ["ok"]
+
+    def test_malformed_entries_are_skipped(self):
+        with open(hotset_service.HOT_SNAPSHOT_PATH, "w") as f:
+            f.write('{"users": [["a"], ["b", "x"], [3, 1], "c", ["d", 2, 1], ["ok", 2]]}')
+        assert hotset_service.load_snapshot() == ["ok"]
+
+    def test_non_list_users_is_ignored(self):
+        with open(hotset_service.HOT_SNAPSHOT_PATH, "w") as f:
+            f.write('{"users": 5}')
+        assert hotset_service.load_snapshot() == []
+        assert hotset_service.prewarm_from_snapshot() == 0
+
+    @patch("services.monkeytype.get_profile")
+    def test_prewarm_from_snapshot_fills_cache(self, mock_gp):
+        def fetch(username, priority, force):
+            _cache(username)
+            return PROFILE
+
+        mock_gp.side_effect = fetch
+        hotset_service.record_hit("alice")
+        hotset_service.save_snapshot()
+        hotset_service.reset()
+
+        assert hotset_service.prewarm_from_snapshot() == 1
+        assert mt_service.get_cached_profile("alice") == PROFILE
+
+    @patch("services.monkeytype.requests.get")
+    def test_startup_prewarm_waits_for_tokens_past_the_cycle_budget(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=200, headers={}, json=MagicMock(return_value=PROFILE))
+        for i in range(40):
+            hotset_service.record_hit(f"user{i}")
+        hotset_service.save_snapshot()
+        hotset_service.reset()
+
+        # More users than the burst allows, so the pre-warm has to wait for refills
+        with patch.object(mt_service, "UPSTREAM_RATE_PER_SECOND", 500.0):
+            assert hotset_service.prewarm_from_snapshot() == 40
+        assert all(mt_service.get_cached_profile(f"user{i}") for i in range(40))
+
+    @patch("services.monkeytype.get_profile")
+    def test_startup_prewarm_uses_startup_priority(self, mock_gp):
+        hotset_service.record_hit("alice")
+        hotset_service.save_snapshot()
+        hotset_service.reset()
+
+        hotset_service.prewarm_from_snapshot()
+        assert mock_gp.call_args.kwargs["priority"] == mt_service.PRIORITY_STARTUP
+
+
+class TestWarmerLeavesRoomForUsers:
+    @patch("services.monkeytype.requests.get")
+    def test_user_misses_get_tokens_right_after_a_warm_cycle(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=200, headers={}, json=MagicMock(return_value=PROFILE))
+        for i in range(50):
+            hotset_service.record_hit(f"user{i}")
+
+        # Start the cycle with the bucket already close to the reserve
+        mt_service._upstream_bucket["tokens"] = mt_service.UPSTREAM_USER_RESERVE + 2.0
+        mt_service._upstream_bucket["ts"] = mt_service.time_mod.monotonic()
+        assert hotset_service.warm_once(budget=50) == 2
+
+        # Users may not wait at all, yet every reserved token is still there for them
+        with patch.dict(mt_service.UPSTREAM_MAX_WAIT_SECONDS, {mt_service.PRIORITY_USER: 0.0}):
+            for _ in range(mt_service.UPSTREAM_USER_RESERVE):
+                mt_service.acquire_upstream(mt_service.PRIORITY_USER)
+
+    @patch("services.monkeytype.requests.get")
+    def test_default_cycle_budget_is_well_under_the_burst(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=200, headers={}, json=MagicMock(return_value=PROFILE))
+        for i in range(50):
+            hotset_service.record_hit(f"user{i}")
+        spent = hotset_service.warm_once()
+        assert spent == hotset_service.HOT_WARM_BUDGET
+        assert mt_service._upstream_bucket["tokens"] >= mt_service.UPSTREAM_BURST / 2
@@ -1,3 +1,11 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+import services.history as history_service
 import services.monkeytype as mt_service
 
 
@@ -156,3 +164,264 @@ class TestGetCardStatsFromProfile:
         assert stats["time_acc"] == "--"
         assert stats["words_wpm"] == "--"
         assert stats["words_acc"] == "--"
+
+
+class TestUpstreamBudget:
+    def _drain(self):
+        mt_service._upstream_bucket["tokens"] = 0.0
+        mt_service._upstream_bucket["ts"] = mt_service.time_mod.monotonic()
+
+    def test_takes_token_when_available(self):
+        before = mt_service._upstream_bucket["tokens"]
+        mt_service.acquire_upstream(mt_service.PRIORITY_USER)
+        assert mt_service._upstream_bucket["tokens"] == pytest.approx(before - 1, abs=0.1)
+
+    def test_prewarm_shed_when_empty(self):
+        self._drain()
+        with pytest.raises(mt_service.UpstreamBudgetExceeded):
+            mt_service.acquire_upstream(mt_service.PRIORITY_PREWARM)
+
+    def test_user_waits_for_refill(self):
+        self._drain()
+        with patch.object(mt_service, "UPSTREAM_RATE_PER_SECOND", 50.0):
+            mt_service.acquire_upstream(mt_service.PRIORITY_USER)
+        assert not mt_service._upstream_queue
+
+    def test_user_shed_after_max_wait(self):
+        self._drain()
+        with patch.dict(mt_service.UPSTREAM_MAX_WAIT_SECONDS, {mt_service.PRIORITY_USER: 0.05}):
+            with pytest.raises(mt_service.UpstreamBudgetExceeded):
+                mt_service.acquire_upstream(mt_service.PRIORITY_USER)
+
+    def test_background_cannot_jump_queued_user(self):
+        self._drain()
+        started = threading.Event()
+        done = []
+
+        def user_call():
+            started.set()
+            mt_service.acquire_upstream(mt_service.PRIORITY_USER)
+            done.append(True)
+
+        with patch.object(mt_service, "UPSTREAM_RATE_PER_SECOND", 5.0):
+            t = threading.Thread(target=user_call)
+            t.start()
+            started.wait()
+            while not mt_service._upstream_queue:
+                pass
+            # A token is free, but the queued user call is ahead of refreshes
+            mt_service._upstream_bucket["tokens"] = 1.0
+            with pytest.raises(mt_service.UpstreamBudgetExceeded):
+                mt_service.acquire_upstream(mt_service.PRIORITY_PREWARM)
+            t.join(timeout=2)
+        assert done == [True]
+
+    def test_reserve_is_kept_for_user_calls(self):
+        mt_service._upstream_bucket["tokens"] = float(mt_service.UPSTREAM_USER_RESERVE)
+        mt_service._upstream_bucket["ts"] = mt_service.time_mod.monotonic()
+        for priority in (mt_service.PRIORITY_REFRESH, mt_service.PRIORITY_PREWARM):
+            with pytest.raises(mt_service.UpstreamBudgetExceeded):
+                mt_service.acquire_upstream(priority)
+        for _ in range(mt_service.UPSTREAM_USER_RESERVE):
+            mt_service.acquire_upstream(mt_service.PRIORITY_USER)
+
+    def test_background_allowed_above_reserve(self):
+        mt_service._upstream_bucket["tokens"] = mt_service.UPSTREAM_USER_RESERVE + 1.0
+        mt_service._upstream_bucket["ts"] = mt_service.time_mod.monotonic()
+        mt_service.acquire_upstream(mt_service.PRIORITY_PREWARM)
+
+    def test_full_queue_rejects_lower_priority(self):
+        self._drain()
+        mt_service._upstream_queue.append([mt_service.PRIORITY_USER, -1, True])
+        with patch.object(mt_service, "UPSTREAM_QUEUE_MAX", 1):
+            with pytest.raises(mt_service.UpstreamBudgetExceeded):
+                mt_service.acquire_upstream(mt_service.PRIORITY_REFRESH)
+
+    @patch("services.monkeytype.requests.get")
+    def test_get_profile_miss_shed_skips_request(self, mock_get):
+        self._drain()
+        with pytest.raises(mt_service.UpstreamBudgetExceeded):
+            mt_service.get_profile("someone", priority=mt_service.PRIORITY_PREWARM)
+        mock_get.assert_not_called()
+
+    @patch("services.monkeytype.requests.get")
+    def test_get_profile_cache_hit_uses_no_budget(self, mock_get):
+        mock_get.return_value = MagicMock(json=MagicMock(return_value={"data": {}}))
+        mt_service.get_profile("someone")
+        self._drain()
+        assert mt_service.get_profile("someone") == {"data": {}}
+        assert mock_get.call_count == 1
+
+
+class _StandInProfileHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the monkeytype profile endpoint."""
+
+    def do_GET(self):
+        server = self.server
+        server.seen_headers.append(dict(self.headers))
+        etag = server.validators.get("ETag")
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(server.profile).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in server.validators.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInProfileHandler)
+    server.profile = {"data": {"name": "someone", "typingStats": {"timeTyping": 60}}}
+    server.validators = {}
+    server.seen_headers = []
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    with patch.object(mt_service, "API_BASE_URL", base_url):
+        yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestConditionalRevalidation:
+    def _expire(self, username):
+        mt_service._profile_cache[username]["ts"] -= mt_service.CACHE_TTL_SECONDS + 1
+
+    def test_stores_validators(self, stand_in_api):
+        stand_in_api.validators = {
+            "ETag": '"v1"',
+            "Last-Modified": "Mon, 19 Oct 2026 10:00:00 GMT",
+        }
+        mt_service.get_profile("someone")
+        entry = mt_service._profile_cache["someone"]
+        assert entry["etag"] == '"v1"'
+        assert entry["last_modified"] == "Mon, 19 Oct 2026 10:00:00 GMT"
+
+    def test_304_extends_cached_entry(self, stand_in_api):
+        stand_in_api.validators = {"ETag": '"v1"'}
+        first = mt_service.get_profile("someone")
+        self._expire("someone")
+
+        with patch.object(mt_service.requests.Response, "json") as mock_json:
+            again = mt_service.get_profile("someone")
+        mock_json.assert_not_called()
+        assert again is first
+        assert stand_in_api.seen_headers[-1]["If-None-Match"] == '"v1"'
+        assert mt_service.get_cached_profile("someone") is first
+
+    def test_changed_profile_is_refetched(self, stand_in_api):
+        stand_in_api.validators = {"ETag": '"v1"'}
+        mt_service.get_profile("someone")
+        self._expire("someone")
+
+        stand_in_api.validators = {"ETag": '"v2"'}
+        stand_in_api.profile = {"data": {"name": "someone", "typingStats": {"timeTyping": 90}}}
+        data = mt_service.get_profile("someone")
+        assert data["data"]["typingStats"]["timeTyping"] == 90
+        assert mt_service._profile_cache["someone"]["etag"] == '"v2"'
+
+    def test_no_validators_sends_plain_request(self, stand_in_api):
+        mt_service.get_profile("someone")
+        self._expire("someone")
+        mt_service.get_profile("someone")
+        assert len(stand_in_api.seen_headers) == 2
+        assert "If-None-Match" not in stand_in_api.seen_headers[-1]
+        assert "If-Modified-Since" not in stand_in_api.seen_headers[-1]
+
+    def test_refresh_records_history(self, stand_in_api):
+        mt_service.get_profile("someone")
+        points = history_service.get_series("someone", "timeTyping")
+        assert [v for _, v in points] == [60.0]
+
+
+class TestAdaptiveTtl:
+    VALUES = {"time:15": 100.0, "timeTyping": 60.0}
+
+    def test_first_fetch_uses_default(self):
+        assert mt_service._next_ttl(None, self.VALUES) == mt_service.CACHE_TTL_SECONDS
+
+    def test_unchanged_grows_up_to_max(self):
+        entry = {"ttl": mt_service.CACHE_TTL_SECONDS, "values": self.VALUES}
+        assert mt_service._next_ttl(entry, dict(self.VALUES)) == mt_service.CACHE_TTL_SECONDS * 2
+        entry["ttl"] = mt_service.CACHE_TTL_MAX_SECONDS
+        assert mt_service._next_ttl(entry, self.VALUES) == mt_service.CACHE_TTL_MAX_SECONDS
+
+    def test_changed_shrinks_down_to_min(self):
+        changed = {"time:15": 105.0, "timeTyping": 90.0}
+        entry = {"ttl": mt_service.CACHE_TTL_SECONDS, "values": self.VALUES}
+        assert mt_service._next_ttl(entry, changed) == mt_service.CACHE_TTL_SECONDS / 2
+        entry["ttl"] = mt_service.CACHE_TTL_MIN_SECONDS
+        assert mt_service._next_ttl(entry, changed) == mt_service.CACHE_TTL_MIN_SECONDS
+
+    def test_entry_ttl_controls_freshness(self):
+        now = mt_service.time_mod.time()
+        mt_service._profile_cache["bob"] = {"data": {}, "ts": now - 400, "ttl": 600}
+        assert mt_service.get_cached_profile("bob") == {}
+        mt_service._profile_cache["bob"]["ttl"] = 300
+        assert mt_service.get_cached_profile("bob") is None
+
+    def test_cache_max_age(self):
+        assert mt_service.get_cache_max_age("nobody") == mt_service.CACHE_TTL_SECONDS
+        now = mt_service.time_mod.time()
+        mt_service._profile_cache["bob"] = {"data": {}, "ts": now - 100, "ttl": 600}
+        assert mt_service.get_cache_max_age("bob") in (499, 500)
+        mt_service._profile_cache["bob"]["ts"] = now - 1000
+        assert mt_service.get_cache_max_age("bob") == 0
+
+    def test_refetch_adapts_ttl(self, stand_in_api):
+        stand_in_api.validators = {"ETag": '"v1"'}
+        mt_service.get_profile("someone")
+        entry = mt_service._profile_cache["someone"]
+        assert entry["ttl"] == mt_service.CACHE_TTL_SECONDS
+
+        # 304: nothing changed, so the entry can live longer
+        entry["ts"] -= entry["ttl"] + 1
+        mt_service.get_profile("someone")
+        assert mt_service._profile_cache["someone"]["ttl"] == mt_service.CACHE_TTL_SECONDS * 2
+
+        # New time typing: tighten again
+        entry = mt_service._profile_cache["someone"]
+        entry["ts"] -= entry["ttl"] + 1
+        stand_in_api.validators = {"ETag": '"v2"'}
+        stand_in_api.profile = {"data": {"name": "someone", "typingStats": {"timeTyping": 90}}}
+        mt_service.get_profile("someone")
+        assert mt_service._profile_cache["someone"]["ttl"] == mt_service.CACHE_TTL_SECONDS
+
+
+class TestForceRefresh:
+    @patch("services.monkeytype.requests.get")
+    def test_force_bypasses_fresh_cache(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=200, json=MagicMock(return_value={"data": {}}))
+        mt_service.get_profile("someone")
+        mt_service.get_profile("someone", force=True)
+        assert mock_get.call_count == 2
+
+
+class TestProfileCacheConcurrency:
+    def test_concurrent_stores_never_lose_the_lru_order(self):
+        errors = []
+
+        def writer(prefix):
+            try:
+                for i in range(2000):
+                    mt_service._store_profile(f"{prefix}{i % 50}", {"data": {}, "ts": 0})
+            except Exception as e:  # pragma: no cover - only on a race
+                errors.append(e)
+
+        with patch.object(mt_service, "CACHE_MAX_ENTRIES", 10):
+            threads = [threading.Thread(target=writer, args=(p,)) for p in "abcd"]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        assert errors == []
+        assert len(mt_service._profile_cache) == 10
@@ -2,6 +2,11 @@ from unittest.mock import patch, MagicMock
 
 import requests.exceptions
 
+import app as app_module
+import services.history as history_service
+import services.hotset as hotset_service
+import services.monkeytype as mt_service
+
 MOCK_PROFILE = {
     "data": {
         "name": "testuser",
@@ -37,6 +42,88 @@ class TestApiThemes:
         assert all("name" in t for t in data)
 
 
+class TestApiCardTemplate:
+    def test_has_placeholders_for_every_field(self, client):
+        resp = client.get("/api/card-template")
+        assert resp.status_code == 200
+        body = resp.data.decode()
+        for field in ("username", "left_stat", "right_acc", "time_typing", "accent", "page_bg"):
+            assert "{{%s}}" % field in body
+
+    @patch("services.monkeytype.get_profile", return_value=MOCK_PROFILE)
+    def test_filled_template_matches_server_render(self, mock_gp, client):
+        template = client.get("/api/card-template").data.decode()
+        theme = app_module.theme_to_card_colors(app_module.THEMES["serika_dark"])
+        values = {
+            **theme,
+            "username": "testuser",
+            "time_typing": "01:01:01",
+            "left_stat": "120",
+            "right_stat": "130",
+            "left_acc": "97",
+            "right_acc": "98",
+            "secondCount": "15",
+            "wordCount": "10",
+        }
+        for key, value in values.items():
+            template = template.replace("{{%s}}" % key, value)
+        server = client.get("/monkeytype.svg?username=testuser").data.decode()
+        assert template == server
+
+
+class TestApiStats:
+    @patch("services.monkeytype.get_profile", return_value=MOCK_PROFILE)
+    def test_returns_every_mode(self, mock_gp, client):
+        resp = client.get("/api/stats?username=testuser")
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert data["username"] == "testuser"
+        assert data["time_typing"] == "01:01:01"
+        assert data["time"]["15"] == {"wpm": 120, "acc": 97}
+        assert data["time"]["60"] == {"wpm": "--", "acc": "--"}
+        assert data["words"]["50"] == {"wpm": 125, "acc": 95}
+        assert set(data["time"]) == app_module.ALLOWED_TIME_VALUES
+        assert set(data["words"]) == app_module.ALLOWED_WORD_VALUES
+
+    @patch("services.monkeytype.get_profile", return_value=MOCK_PROFILE)
+    def test_mode_sets_of_different_sizes(self, mock_gp, client):
+        with patch.object(app_module, "ALLOWED_TIME_VALUES", {"15", "30", "60", "120", "180"}):
+            data = client.get("/api/stats?username=testuser").get_json()
+        assert set(data["time"]) == {"15", "30", "60", "120", "180"}
+        assert set(data["words"]) == app_module.ALLOWED_WORD_VALUES
+        assert data["time"]["30"] == {"wpm": 115, "acc": 96}
+
+    @patch("services.monkeytype.get_profile", return_value=MOCK_PROFILE)
+    def test_one_lookup_per_mode_pair(self, mock_gp, client):
+        with patch(
+            "services.monkeytype.get_card_stats_from_profile",
+            wraps=mt_service.get_card_stats_from_profile,
+        ) as mock_stats:
+            client.get("/api/stats?username=testuser")
+        longest = max(len(app_module.ALLOWED_TIME_VALUES), len(app_module.ALLOWED_WORD_VALUES))
+        assert mock_stats.call_count == longest
+
+    def test_invalid_username(self, client):
+        resp = client.get("/api/stats?username=!!!")
+        assert resp.status_code == 400
+        assert "error" in resp.get_json()
+
+    @patch("services.monkeytype.get_profile")
+    def test_api_404(self, mock_gp, client):
+        mock_resp = MagicMock()
+        mock_resp.status_code = 404
+        mock_gp.side_effect = requests.exceptions.HTTPError(response=mock_resp)
+        resp = client.get("/api/stats?username=testuser")
+        assert resp.status_code == 404
+        assert "could not find user" in resp.get_json()["error"]
+
+    @patch("services.monkeytype.get_profile")
+    def test_private_profile(self, mock_gp, client):
+        mock_gp.return_value = {"data": {"personalBests": {}}}
+        resp = client.get("/api/stats?username=testuser")
+        assert "private" in resp.get_json()["error"]
+
+
 class TestMonkeytypeSvgValid:
     @patch("services.monkeytype.get_profile", return_value=MOCK_PROFILE)
     def test_valid_request(self, mock_gp, client):
@@ -45,6 +132,20 @@ class TestMonkeytypeSvgValid:
         assert "image/svg+xml" in resp.content_type
 
 
+class TestMonkeytypeSvgHotSet:
+    @patch("services.monkeytype.get_profile", return_value=MOCK_PROFILE)
+    def test_successful_requests_feed_the_sketch(self, mock_gp, client):
+        client.get("/monkeytype.svg?username=testuser")
+        client.get("/monkeytype.svg?username=testuser")
+        assert hotset_service._counts["testuser"][0] == 2
+
+    @patch("services.monkeytype.get_profile")
+    def test_missing_users_are_not_tracked(self, mock_gp, client):
+        mock_gp.side_effect = requests.exceptions.HTTPError(response=MagicMock(status_code=404))
+        client.get("/monkeytype.svg?username=ghost")
+        assert "ghost" not in hotset_service._counts
+
+
 class TestMonkeytypeSvgInvalidParams:
     def test_invalid_username(self, client):
         resp = client.get("/monkeytype.svg?username=!!!")
@@ -61,6 +162,59 @@ class TestMonkeytypeSvgInvalidParams:
         assert resp.status_code == 400
         assert "image/svg+xml" in resp.content_type
 
+    def test_invalid_variant(self, client):
+        resp = client.get("/monkeytype.svg?username=test&variant=pie")
+        assert resp.status_code == 400
+        assert "image/svg+xml" in resp.content_type
+
+
+class TestMonkeytypeSvgCacheControl:
+    def test_max_age_follows_entry_ttl(self, client):
+        mt_service._profile_cache["testuser"] = {
+            "data": MOCK_PROFILE, "ts": mt_service.time_mod.time(), "ttl": 1800
+        }
+        resp = client.get("/monkeytype.svg?username=testuser")
+        max_age = int(resp.headers["Cache-Control"].split("max-age=")[1])
+        assert 1790 <= max_age <= 1800
+
+    def test_error_keeps_default_max_age(self, client):
+        resp = client.get("/monkeytype.svg?username=!!!")
+        assert resp.headers["Cache-Control"] == "public, max-age=300"
+
+
+class TestMonkeytypeSvgCompact:
+    @patch("services.monkeytype.get_profile", return_value=MOCK_PROFILE)
+    def test_compact_is_smaller(self, mock_gp, client):
+        full = client.get("/monkeytype.svg?username=testuser")
+        compact = client.get("/monkeytype.svg?username=testuser&compact=1")
+        assert compact.status_code == 200
+        assert "image/svg+xml" in compact.content_type
+        assert len(compact.data) < len(full.data)
+        assert "minify;dur=" in compact.headers["Server-Timing"]
+
+    def test_compact_error_svg(self, client):
+        resp = client.get("/monkeytype.svg?username=!!!&compact=1")
+        assert resp.status_code == 400
+        assert "<!--" not in resp.data.decode()
+
+
+class TestMonkeytypeSvgTrend:
+    @patch("services.monkeytype.get_profile", return_value=MOCK_PROFILE)
+    def test_renders_sparkline_from_history(self, mock_gp, client):
+        history_service.record("testuser", {"time:15": 100.0}, 1000)
+        history_service.record("testuser", {"time:15": 120.0}, 2000)
+        resp = client.get("/monkeytype.svg?username=testuser&variant=trend")
+        assert resp.status_code == 200
+        body = resp.data.decode()
+        assert "<polyline" in body
+        assert "not enough history yet" in body  # no words:10 points
+        assert mock_gp.call_count == 1
+
+    @patch("services.monkeytype.get_profile", return_value=MOCK_PROFILE)
+    def test_history_phase_is_timed(self, mock_gp, client):
+        resp = client.get("/monkeytype.svg?username=testuser&variant=trend")
+        assert "history;dur=" in resp.headers["Server-Timing"]
+
 
 class TestMonkeytypeSvgApiErrors:
     @patch("services.monkeytype.get_profile")
@@ -73,6 +227,15 @@ class TestMonkeytypeSvgApiErrors:
         assert "image/svg+xml" in resp.content_type
 
 
+class TestMonkeytypeSvgUpstreamBudget:
+    @patch("services.monkeytype.get_profile")
+    def test_budget_exceeded_returns_503(self, mock_gp, client):
+        mock_gp.side_effect = mt_service.UpstreamBudgetExceeded("budget")
+        resp = client.get("/monkeytype.svg?username=testuser")
+        assert resp.status_code == 503
+        assert "busy" in resp.data.decode()
+
+
 class TestMonkeytypeSvgPrivateProfile:
     @patch("services.monkeytype.get_profile")
     def test_private_profile(self, mock_gp, client):
@@ -82,6 +245,16 @@ class TestMonkeytypeSvgPrivateProfile:
         assert "image/svg+xml" in resp.content_type
         assert "private" in resp.data.decode().lower()
 
+    @patch("services.monkeytype.requests.get")
+    def test_null_personal_bests_is_private(self, mock_get, client):
+        mock_get.return_value = MagicMock(
+            status_code=200, headers={},
+            json=MagicMock(return_value={"data": {"personalBests": None}}),
+        )
+        resp = client.get("/monkeytype.svg?username=testuser")
+        assert resp.status_code == 200
+        assert "private" in resp.data.decode().lower()
+
 
 class TestRateLimiting:
     @patch("services.monkeytype.get_profile", return_value=MOCK_PROFILE)
@@ -92,3 +265,67 @@ class TestRateLimiting:
 
         resp = client.get("/monkeytype.svg?username=testuser")
         assert resp.status_code == 429
+
+
+def _upstream_ok(url, **kwargs):
+    return MagicMock(status_code=200, headers={}, json=MagicMock(return_value=MOCK_PROFILE))
+
+
+class TestServerTiming:
+    @patch("services.monkeytype.requests.get", side_effect=_upstream_ok)
+    def test_header_lists_each_phase(self, mock_get, client):
+        resp = client.get("/monkeytype.svg?username=testuser")
+        header = resp.headers["Server-Timing"]
+        for phase in ("ratelimit", "cache", "budget", "upstream", "record", "stats", "render"):
+            assert f"{phase};dur=" in header
+
+    def test_cache_hit_has_no_upstream_phase(self, client):
+        mt_service._profile_cache["testuser"] = {
+            "data": MOCK_PROFILE, "ts": mt_service.time_mod.time()
+        }
+        resp = client.get("/monkeytype.svg?username=testuser")
+        assert "cache;dur=" in resp.headers["Server-Timing"]
+        assert "upstream" not in resp.headers["Server-Timing"]
+
+    def test_no_header_on_other_routes(self, client):
+        resp = client.get("/api/themes")
+        assert "Server-Timing" not in resp.headers
+
+    @patch("services.monkeytype.requests.get", side_effect=_upstream_ok)
+    def test_span_hook_receives_phases(self, mock_get, client):
+        spans = []
+        app_module.register_span_hook(spans.append)
+        try:
+            client.get("/monkeytype.svg?username=testuser")
+            client.get("/monkeytype.svg?username=testuser")
+        finally:
+            app_module._span_hooks.clear()
+
+        first_id = spans[0]["request_id"]
+        first = [s for s in spans if s["request_id"] == first_id]
+        second = [s for s in spans if s["request_id"] != first_id]
+        assert [s["name"] for s in first] == [
+            "ratelimit", "cache", "budget", "upstream", "record", "stats", "render"
+        ]
+        # Second request is a cache hit, and gets its own trace
+        assert [s["name"] for s in second] == ["ratelimit", "cache", "stats", "render"]
+        assert len({s["request_id"] for s in second}) == 1
+        assert all(s["username"] == "testuser" for s in spans)
+        assert all(s["status"] == 200 for s in spans)
+
+    @patch("services.monkeytype.requests.get", side_effect=_upstream_ok)
+    def test_budget_wait_is_not_counted_as_upstream(self, mock_get, client):
+        with patch.object(mt_service, "acquire_upstream", lambda priority: mt_service.time_mod.sleep(0.05)):
+            resp = client.get("/monkeytype.svg?username=testuser")
+        durations = {
+            part.split(";dur=")[0].strip(): float(part.split(";dur=")[1])
+            for part in resp.headers["Server-Timing"].split(",")
+        }
+        assert durations["budget"] >= 50
+        assert durations["upstream"] < 50
+
+    @patch("services.monkeytype.get_profile", return_value=MOCK_PROFILE)
+    def test_slow_request_is_logged(self, mock_gp, client, caplog):
+        with patch.object(app_module, "SLOW_REQUEST_MS", 0):
+            client.get("/monkeytype.svg?username=testuser")
+        assert any('"phases"' in r.getMessage() for r in caplog.records)